@@ -0,0 +1,361 @@
+"""
+intervaltree: A mutable, self-balancing interval tree for Python 2 and 3.
+Queries may be by point, by range overlap, or by range envelopment.
+
+Core logic: internal tree nodes of the augmented engine.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from node import Node
+
+
+class AugmentedNode(Node):
+    """
+    A node of an AVL tree keyed on interval begin, where every node
+    also records the greatest end in its subtree (max_end).
+
+    x_center is the key, and s_center holds all intervals that begin
+    at x_center. Unlike the centered tree, intervals never move
+    between nodes on rotation or deletion; only max_end has to be
+    refreshed. Any subtree whose max_end does not pass the query's
+    begin can be skipped, so range queries take O(log n + m) time
+    without consulting the boundary table.
+    """
+    def __init__(self,
+                 x_center=None,
+                 s_center=set(),
+                 left_node=None,
+                 right_node=None):
+        self.max_end = None
+        Node.__init__(self, x_center, s_center, left_node, right_node)
+
+    @classmethod
+    def from_interval(cls, interval):
+        """
+        :rtype : AugmentedNode
+        """
+        return AugmentedNode(interval.begin, [interval])
+
+    @classmethod
+    def from_intervals(cls, intervals):
+        """
+        :rtype : AugmentedNode
+        """
+        return AugmentedNode.from_sorted_intervals(
+            sorted(intervals, key=lambda iv: iv.begin))
+
+    @classmethod
+    def from_sorted_intervals(cls, intervals):
+        """
+        Builds a perfectly balanced subtree from a list of intervals
+        sorted by begin.
+        :rtype : AugmentedNode
+        """
+        groups = []
+        for iv in intervals:
+            if groups and groups[-1][0] == iv.begin:
+                groups[-1][1].append(iv)
+            else:
+                groups.append((iv.begin, [iv]))
+        return AugmentedNode._from_groups(groups, 0, len(groups))
+
+    @classmethod
+    def _from_groups(cls, groups, lo, hi):
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        key, ivs = groups[mid]
+        return AugmentedNode(
+            key, ivs,
+            AugmentedNode._from_groups(groups, lo, mid),
+            AugmentedNode._from_groups(groups, mid + 1, hi)
+        )
+
+    def center_hit(self, interval):
+        """Returns whether interval belongs in this node."""
+        return interval.begin == self.x_center
+
+    def refresh_balance(self):
+        """
+        Recalculate self.balance, self.depth and self.max_end based on
+        child node values.
+        """
+        Node.refresh_balance(self)
+        max_end = max(iv.end for iv in self.s_center) if self.s_center else None
+        for child in (self.left_node, self.right_node):
+            if child and (max_end is None or child.max_end > max_end):
+                max_end = child.max_end
+        self.max_end = max_end
+
+    def rotate(self):
+        """
+        Does rotating, if necessary, to balance this node, and
+        returns the new top node.
+        """
+        self.refresh_balance()
+        if abs(self.balance) < 2:
+            return self
+        my_heavy = self.balance > 0
+        child_heavy = self[my_heavy].balance > 0
+        if my_heavy == child_heavy or self[my_heavy].balance == 0:
+            return self.srotate()
+        else:
+            return self.drotate()
+
+    def srotate(self):
+        """Single rotation. Assumes that balance is +-2."""
+        if self.shared:
+            return self.unshared().srotate()
+        heavy = self.balance > 0
+        light = not heavy
+        save = self[heavy]
+        if save.shared:
+            save = save.unshared()
+        self[heavy] = save[light]
+        self.refresh_balance()
+        save[light] = self
+        save.refresh_balance()
+        return save
+
+    def add(self, interval):
+        """
+        Returns self after adding the interval and balancing.
+        """
+        if self.shared:
+            return self.unshared().add(interval)
+        if self.center_hit(interval):
+            self.s_center.add(interval)
+            self.center_changed()
+            self.refresh_balance()
+            return self
+        direction = self.hit_branch(interval)
+        if not self[direction]:
+            self[direction] = AugmentedNode.from_interval(interval)
+        else:
+            self[direction] = self[direction].add(interval)
+        return self.rotate()
+
+    def remove_interval_helper(self, interval, done, should_raise_error):
+        """
+        Returns self after removing interval and balancing.
+        If interval doesn't exist and should_raise_error is set, raise
+        ValueError.
+
+        Every ancestor of the changed node is rebalanced, since its
+        max_end may have changed; done is not used.
+        """
+        if self.shared:
+            return self.unshared().remove_interval_helper(
+                interval, done, should_raise_error)
+        if self.center_hit(interval):
+            if interval not in self.s_center:
+                if should_raise_error:
+                    raise ValueError
+                return self
+            self.s_center.remove(interval)
+            self.center_changed()
+            if self.s_center:
+                self.refresh_balance()
+                return self
+            return self.prune()
+
+        direction = self.hit_branch(interval)
+        if not self[direction]:
+            if should_raise_error:
+                raise ValueError
+            return self
+        self[direction] = self[direction].remove_interval_helper(
+            interval, done, should_raise_error)
+        return self.rotate()
+
+    def prune(self):
+        """
+        On a subtree where the root node's s_center is empty,
+        return a new subtree with no empty s_centers.
+        """
+        if self.shared:
+            return self.unshared().prune()
+        if not self[0] or not self[1]:
+            return self[not self[0]]
+        # Replace the root node with its successor.
+        heir, right = self[1].pop_least_child()
+        heir[0], heir[1] = self[0], right
+        return heir.rotate()
+
+    def pop_least_child(self):
+        """
+        Returns (least_child, node), where least_child is the detached
+        node with the smallest key, and node is the rest of the
+        subtree after balancing.
+        """
+        if self.shared:
+            return self.unshared().pop_least_child()
+        if not self.left_node:
+            rest = self.right_node
+            self.right_node = None
+            return self, rest
+        least, self.left_node = self.left_node.pop_least_child()
+        return least, self.rotate()
+
+    def _search(self, low, high, inclusive, append):
+        """
+        Passes every interval with end > low and with begin < high (or
+        begin <= high, if inclusive) to append.
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node is None or node.max_end <= low:
+                continue
+            stack.append(node.left_node)
+            key = node.x_center
+            if key < high or (inclusive and key == high):
+                if node._by_end is None:
+                    node.sorted_center()
+                for iv in reversed(node._by_end):
+                    if iv.end <= low:
+                        break
+                    append(iv)
+                stack.append(node.right_node)
+
+    def _any(self, low, high, inclusive):
+        """
+        Returns whether _search(low, high, inclusive) would find
+        anything.
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node is None or node.max_end <= low:
+                continue
+            key = node.x_center
+            if key < high or (inclusive and key == high):
+                if node._by_end is None:
+                    node.sorted_center()
+                if node._by_end[-1].end > low:
+                    return True
+                stack.append(node.right_node)
+            stack.append(node.left_node)
+        return False
+
+    def stab_point(self, point, out):
+        """
+        Appends all intervals that contain point to the list out, and
+        returns out.
+        """
+        self._search(point, point, True, out.append)
+        return out
+
+    def search_range(self, begin, end, out):
+        """
+        Appends all intervals that overlap [begin, end) to the list
+        out, and returns out.
+        """
+        self._search(begin, end, False, out.append)
+        return out
+
+    def search_contained(self, begin, end):
+        """
+        Yields all intervals iv with begin <= iv.begin and
+        iv.end <= end, lazily. Only nodes with keys in [begin, end) are
+        visited, and each one's intervals are scanned in order of end
+        until they pass end.
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            key = node.x_center
+            if key < begin:
+                stack.append(node.right_node)
+                continue
+            stack.append(node.left_node)
+            if key < end:
+                if node._by_end is None:
+                    node.sorted_center()
+                for iv in node._by_end:
+                    if iv.end > end:
+                        break
+                    yield iv
+                stack.append(node.right_node)
+
+    def child_bounds(self, direction, lo, hi):
+        """
+        Like Node.child_bounds(), but the child's max_end bounds its
+        ends, and intervals to the right begin after x_center.
+        """
+        if direction:
+            return self.x_center, self[1].max_end
+        return lo, self[0].max_end
+
+    def contains_point(self, p):
+        """
+        Returns whether this node or a child overlaps p.
+        """
+        return self._any(p, p, True)
+
+    def overlaps_range(self, begin, end):
+        """
+        Returns whether this node or a child overlaps [begin, end).
+        """
+        return self._any(begin, end, False)
+
+    def verify(self, parents=set()):
+        """
+        ## DEBUG ONLY ##
+        Recursively ensures that the invariants of an augmented
+        subtree hold. parents is unused; it is accepted for
+        compatibility with Node.verify().
+        """
+        assert isinstance(self.s_center, set)
+        bal, max_end = self.balance, self.max_end
+        assert abs(bal) < 2, \
+            "Error: Rotation should have happened, but didn't! \n{}".format(
+                self.print_structure(tostring=True)
+            )
+        self.refresh_balance()
+        assert bal == self.balance, \
+            "Error: self.balance not set correctly! \n{}".format(
+                self.print_structure(tostring=True)
+            )
+        assert max_end == self.max_end, \
+            "Error: self.max_end not set correctly! \n{}".format(
+                self.print_structure(tostring=True)
+            )
+        assert self.s_center, \
+            "Error: s_center is empty! \n{}".format(
+                self.print_structure(tostring=True)
+            )
+        for iv in self.s_center:
+            assert iv.begin < iv.end
+            assert iv.begin == self.x_center
+        if self[0]:
+            assert self[0].x_center < self.x_center, \
+                "Error: Out-of-order left child! {}".format(self.x_center)
+            self[0].verify()
+        if self[1]:
+            assert self[1].x_center > self.x_center, \
+                "Error: Out-of-order right child! {}".format(self.x_center)
+            self[1].verify()
+
+    def __str__(self):
+        """
+        Shows info about this node.
+        """
+        return "AugmentedNode<{0}, depth={1}, balance={2}, max_end={3}>".format(
+            self.x_center,
+            self.depth,
+            self.balance,
+            self.max_end
+        )
@@ -0,0 +1,403 @@
+'''
+    File name      : benchmark.py
+    Author         : Jinwook Jung
+    Created on     : Sun Oct 18 09:12:40 2026
+    Last modified  : 2026-10-18 09:12:40
+    Python version : 3.8
+'''
+
+import heapq
+import io
+import random
+from collections import OrderedDict
+from contextlib import redirect_stdout
+from copy import deepcopy
+from functools import cmp_to_key
+from timeit import default_timer as timer
+
+from interval import Interval, range_key
+from intervaltree import ENGINES, IntervalTree
+from sorteddict import SortedDict
+
+
+def timed(label, func, *args):
+    ''' Run func(*args) once, print the elapsed time and return the result. '''
+    start = timer()
+    result = func(*args)
+    print("    %-40s %10.4f s" % (label, timer() - start))
+    return result
+
+
+def random_intervals(n, span=10**6, max_length=1000, seed=0):
+    ''' Return n random intervals in [0, span + max_length). '''
+    rng = random.Random(seed)
+    ivs = list()
+    for i in range(n):
+        begin = rng.randrange(span)
+        ivs.append(Interval(begin, begin + rng.randint(1, max_length), i))
+    return ivs
+
+
+def random_ranges(n, span=10**6, max_length=1000, seed=1):
+    rng = random.Random(seed)
+    ranges = list()
+    for i in range(n):
+        begin = rng.randrange(span)
+        ranges.append((begin, begin + rng.randint(1, max_length)))
+    return ranges
+
+
+class ResortedBoundaryTable:
+    ''' The boundary table as it used to be: an OrderedDict re-sorted on
+    every new key, scanned linearly for range queries.
+    '''
+    def __init__(self):
+        self.table = OrderedDict()
+
+    def add(self, key):
+        if key in self.table:
+            self.table[key] += 1
+        else:
+            self.table[key] = 1
+            self.table = OrderedDict(sorted(self.table.items(),
+                                            key=lambda t:t[0]))
+
+    def bounds_in(self, begin, end):
+        return [b for b in self.table if begin < b < end]
+
+
+def bench_interval(n):
+    ''' Sorting and hashing Intervals, as tree construction and
+    merge_overlaps() do.
+    '''
+    print("Interval (%d intervals)" % n)
+    ivs = random_intervals(n, span=n)
+
+    def sort_by_cmp():
+        return sorted(ivs, key=cmp_to_key(Interval.__cmp__))
+
+    expected = timed("sorted(), through __cmp__()", sort_by_cmp)
+    assert timed("sorted()", sorted, ivs) == expected
+    by_range = timed("sorted(key=range_key)",
+                     lambda: sorted(ivs, key=range_key))
+    assert [range_key(iv) for iv in by_range] == \
+        [range_key(iv) for iv in expected]
+    assert len(timed("set() insertion", set, ivs)) == n
+    print("")
+
+
+def bench_array(n, q):
+    ''' Building a tree from parallel arrays, and Interval predicates
+    applied one by one vs. vectorized.
+    '''
+    from intervalarray import IntervalArray
+
+    print("IntervalArray (%d intervals, %d range queries)" % (n, q))
+    ivs = random_intervals(n)
+    array = timed("IntervalArray.from_intervals()",
+                  IntervalArray.from_intervals, ivs)
+    ranges = random_ranges(q // 10)
+
+    expected = timed("IntervalTree(intervals)", IntervalTree, ivs)
+    assert timed("IntervalTree(array)", IntervalTree, array) == expected
+    hits = timed("iv.overlaps(begin, end) per interval", lambda: [
+        sum(iv.overlaps(b, e) for iv in ivs) for b, e in ranges])
+    assert timed("array.overlaps(begin, end)", lambda: [
+        int(array.overlaps(b, e).sum()) for b, e in ranges]) == hits
+    print("")
+
+
+def bench_boundary_index(n, q):
+    ''' Bulk load and range-query throughput of the boundary index. The
+    re-sorted table is quadratic, so keep n in the low thousands.
+    '''
+    print("Boundary index (%d intervals, %d range queries)" % (n, q))
+    ivs = random_intervals(n)
+    ranges = random_ranges(q)
+
+    def load_old():
+        table = ResortedBoundaryTable()
+        for iv in ivs:
+            table.add(iv.begin)
+            table.add(iv.end)
+        return table
+
+    def load_new():
+        table = SortedDict()
+        for iv in ivs:
+            table[iv.begin] = table.get(iv.begin, 0) + 1
+            table[iv.end] = table.get(iv.end, 0) + 1
+        return table
+
+    def query_old(table):
+        return sum(len(table.bounds_in(b, e)) for b, e in ranges)
+
+    def query_new(table):
+        return sum(len(list(table.irange(b, e, inclusive=(False, False))))
+                   for b, e in ranges)
+
+    old = timed("OrderedDict, re-sorted: load", load_old)
+    new = timed("SortedDict: load", load_new)
+    hits_old = timed("OrderedDict, re-sorted: range queries", query_old, old)
+    hits_new = timed("SortedDict: range queries", query_new, new)
+    assert hits_old == hits_new
+    print("")
+
+
+def bench_tree(n, q):
+    ''' Construction and range search on a whole IntervalTree. '''
+    print("IntervalTree (%d intervals, %d range queries)" % (n, q))
+    ivs = random_intervals(n)
+    ranges = random_ranges(q)
+
+    tree = timed("IntervalTree(intervals)", IntervalTree, ivs)
+    ivs_sorted = sorted(ivs, key=lambda iv: (iv.begin, iv.end))
+    timed("IntervalTree.from_sorted_arrays()", IntervalTree.from_sorted_arrays,
+          [iv.begin for iv in ivs_sorted], [iv.end for iv in ivs_sorted],
+          [iv.data for iv in ivs_sorted])
+    timed("tree.search(begin, end)",
+          lambda: [tree.search(b, e) for b, e in ranges])
+    timed("tree.overlaps(begin, end)",
+          lambda: [tree.overlaps(b, e) for b, e in ranges])
+    timed("tree.find_nested()", tree.find_nested)
+    timed("tree.nearest(begin, k=5)",
+          lambda: [tree.nearest(b, k=5) for b, _ in ranges])
+
+    frozen = timed("tree.freeze()", tree.freeze)
+    timed("frozen.search(begin, end)",
+          lambda: [frozen.search(b, e) for b, e in ranges])
+    timed("frozen.overlaps(begin, end)",
+          lambda: [frozen.overlaps(b, e) for b, e in ranges])
+    print("")
+
+
+def bench_engines(n, q):
+    ''' The same workload on each IntervalTree engine. '''
+    print("Engines (%d intervals, %d queries)" % (n, q))
+    ivs = random_intervals(n)
+    ranges = random_ranges(q, max_length=10**4)
+    points = [b for b, _ in ranges]
+
+    for engine in sorted(ENGINES):
+        tree = timed("%s: build" % engine, IntervalTree, ivs, engine)
+        timed("%s: remove and re-add 10%%" % engine, lambda: [
+            (tree.remove(iv), tree.add(iv)) for iv in ivs[::10]])
+        timed("%s: tree.stab(p)" % engine,
+              lambda: [tree.stab(p) for p in points])
+        timed("%s: tree.search(begin, end)" % engine,
+              lambda: [tree.search(b, e) for b, e in ranges])
+        timed("%s: tree.overlaps(begin, end)" % engine,
+              lambda: [tree.overlaps(b, e) for b, e in ranges])
+        timed("%s: tree.search(.., strict=True)" % engine,
+              lambda: [tree.search(b, e, strict=True) for b, e in ranges])
+        timed("%s: tree.chop(begin, end)" % engine,
+              lambda: [tree.chop(b, e) for b, e in ranges[:q // 10]])
+    print("")
+
+
+def bench_batch(n):
+    ''' Bulk edits one interval at a time vs. through tree.apply(). '''
+    print("Bulk edits (%d intervals, %d edits)" % (n, n))
+    ivs = random_intervals(n)
+    adds = random_intervals(n // 2, seed=2)
+    removes = ivs[::2]
+
+    def one_by_one():
+        tree = IntervalTree(ivs)
+        for iv in removes:
+            tree.remove(iv)
+        for iv in adds:
+            tree.add(iv)
+        return tree
+
+    def batched():
+        tree = IntervalTree(ivs)
+        tree.apply(adds=adds, removes=removes)
+        return tree
+
+    expected = timed("add()/remove() one by one", one_by_one)
+    assert timed("tree.apply(adds, removes)", batched) == expected
+    print("")
+
+
+def bench_fork(n, forks=20, edits=5):
+    ''' Forking a tree and editing a few intervals in each fork. '''
+    print("Forks (%d intervals, %d forks of %d edits)" % (n, forks, edits))
+    ivs = random_intervals(n)
+    tree = IntervalTree(ivs)
+    adds = random_intervals(forks * edits, seed=4)
+
+    def fork(make_copy):
+        for i in range(forks):
+            fork = make_copy()
+            for iv in adds[i * edits:(i + 1) * edits]:
+                fork.add(iv)
+            fork.remove(ivs[i])
+
+    timed("rebuild, then edit",
+          fork, lambda: IntervalTree(tree.all_intervals))
+    timed("tree.copy(), then edit", fork, tree.copy)
+    print("")
+
+
+def bench_join(n, q):
+    ''' All overlapping pairs between two trees. '''
+    print("Overlap join (%d x %d intervals)" % (n, q))
+    tree = IntervalTree(random_intervals(n))
+    other = IntervalTree(random_intervals(q, max_length=10**4, seed=3))
+
+    pairs = timed("search() per interval of other", lambda: sum(
+        len(tree.search(iv.begin, iv.end)) for iv in other))
+    assert timed("tree.overlap_join(other)", lambda: sum(
+        1 for _ in tree.overlap_join(other))) == pairs
+    indices, _ = timed("tree.overlap_join(other, as_arrays=True)",
+                       tree.overlap_join, other, True)
+    assert len(indices) == pairs
+    print("")
+
+
+def bench_depth(n, q):
+    ''' Coverage depth: len(tree[p]) at each boundary vs. the depth
+    profile and the depth index.
+    '''
+    print("Coverage depth (%d intervals, %d range queries)" % (n, q))
+    tree = IntervalTree(random_intervals(n))
+    ranges = random_ranges(q, max_length=10**4)
+
+    def by_stabbing():
+        return [len(tree[p]) for p in tree.boundary_table]
+
+    depths = timed("len(tree[p]) at each boundary", by_stabbing)
+    _, profile = timed("tree.depth_profile()", tree.depth_profile)
+    assert profile.tolist() == depths
+    timed("tree.max_depth(begin, end), first call",
+          tree.max_depth, *ranges[0])
+    timed("tree.max_depth(begin, end)",
+          lambda: [tree.max_depth(b, e) for b, e in ranges])
+    print("")
+
+
+def bench_parallel(n, q, workers=(1, 2, 4)):
+    ''' Range queries in one process vs. spread over worker processes.
+    Only scales with the number of free cores.
+    '''
+    print("Parallel search (%d intervals, %d range queries)" % (n, q))
+    tree = IntervalTree(random_intervals(n))
+    frozen = tree.freeze()
+    ranges = random_ranges(q, max_length=10**4)
+
+    expected = timed("frozen.search_indices() in-process", lambda: [
+        frozen.search_indices(b, e) for b, e in ranges])
+    for count in workers:
+        found = timed("frozen.parallel_search(workers=%d)" % count,
+                      frozen.parallel_search, ranges, count, False, True)
+        assert all((a == b).all() for a, b in zip(found, expected))
+    print("")
+
+
+def bench_point_queries(n, q):
+    ''' Point stabbing on heavily overlapping intervals, where a single
+    s_center holds a large share of the tree.
+    '''
+    print("Point queries, heavy overlap (%d intervals, %d points)" % (n, q))
+    ivs = random_intervals(n, span=10**4, max_length=10**5)
+    points = [p for p, _ in random_ranges(q, span=10**5)]
+
+    tree = IntervalTree(ivs)
+    hits_set = timed("tree[p]", lambda: sum(len(tree[p]) for p in points))
+    hits_list = timed("tree.stab(p, out)", lambda: sum(
+        len(tree.stab(p, [])) for p in points))
+    assert hits_set == hits_list
+    offsets, _ = timed("tree.search_points(points)", tree.search_points,
+                       points)
+    assert offsets[-1] == hits_set
+    print("")
+
+
+def random_partitioner(n, span=1000, seed=5):
+    ''' Return a Partitioner over n random sink reaches inside one large
+    source, with the bounds and node candidates generated.
+    '''
+    from intersection_test import Partitioner, Reach
+
+    rng = random.Random(seed)
+    partitioner = Partitioner()
+    for i in range(n):
+        llx, lly = rng.uniform(0, span), rng.uniform(0, span)
+        partitioner.add_sink(Reach("s%d" % i, llx, lly,
+                                       llx + rng.uniform(span / 20, span / 3),
+                                       lly + rng.uniform(span / 20, span / 3)))
+    partitioner.source = Reach("src", -1, -1, 2 * span, 2 * span)
+    for s in partitioner.sinks:
+        partitioner.x_bounds.add_bound(s, s.llx, 'lower')
+        partitioner.x_bounds.add_bound(s, s.urx, 'upper')
+        partitioner.y_bounds.add_bound(s, s.lly, 'lower')
+        partitioner.y_bounds.add_bound(s, s.ury, 'upper')
+    partitioner.initialize_interval_trees()
+    partitioner.generate_nodes()
+    return partitioner
+
+
+def select_nodes_reheapify(partitioner):
+    ''' Greedy node selection as it used to be: every remaining node is
+    updated and the heap rebuilt after each pick.
+    '''
+    selected = list()
+    sink_names = {s.name for s in partitioner.sinks}
+    heap = [(-len(n), -n.area, n.id, n)
+            for n in (deepcopy(n) for n in partitioner.nodes)]
+    while len(sink_names) > 0:
+        heapq.heapify(heap)
+        selected.append(heapq.heappop(heap)[-1])
+        sink_covered = selected[-1].sink_name_list
+        sink_names = sink_names - set(sink_covered)
+        for n in heap:
+            n[-1].remove_sinks_by_name_set(sink_covered)
+        heap = [(-len(n), -n.area, n.id, n) for _, _, _, n in heap]
+    return selected
+
+
+def bench_select_nodes(sink_counts=(50, 100, 200, 400)):
+    ''' Greedy node selection of the Partitioner, rebuilding the heap on
+    every pick vs. with lazily refreshed keys.
+    '''
+    print("Partitioner.select_nodes()")
+    for n in sink_counts:
+        with redirect_stdout(io.StringIO()):
+            partitioner = random_partitioner(n)
+        label = "%d sinks, %d nodes" % (n, len(partitioner.nodes))
+
+        expected = timed("%s: re-heapify" % label,
+                         select_nodes_reheapify, partitioner)
+
+        def lazy():
+            with redirect_stdout(io.StringIO()):
+                partitioner.select_nodes()
+            return partitioner.selected
+
+        selected = timed("%s: lazy" % label, lazy)
+        assert [n.name for n in selected] == [n.name for n in expected]
+    print("")
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser("Benchmark the interval tree.")
+    parser.add_argument('-n', action='store', dest='n', type=int,
+                        default=20000, help="number of intervals")
+    parser.add_argument('-q', action='store', dest='q', type=int,
+                        default=2000, help="number of queries")
+    opt = parser.parse_args()
+
+    bench_interval(opt.n * 10)
+    bench_array(opt.n, opt.q)
+    bench_boundary_index(min(opt.n, 4000), opt.q)
+    bench_tree(opt.n, opt.q)
+    bench_engines(opt.n, opt.q)
+    bench_batch(opt.n)
+    bench_fork(opt.n)
+    bench_join(opt.n, opt.q)
+    bench_depth(opt.n, opt.q)
+    bench_parallel(opt.n, opt.q * 10)
+    bench_point_queries(opt.n, opt.q)
+    bench_select_nodes()
@@ -0,0 +1,151 @@
+"""
+intervaltree: A mutable, self-balancing interval tree for Python 2 and 3.
+Queries may be by point, by range overlap, or by range envelopment.
+
+Core logic: coverage depth index.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from bisect import bisect_left, bisect_right
+
+
+class DepthTree(object):
+    """
+    A segment tree over the elementary segments [bounds[i],
+    bounds[i + 1]) of a fixed, sorted list of boundaries, holding the
+    number of intervals covering each segment. Adding or removing an
+    interval whose endpoints are both boundaries is a range increment,
+    and the greatest depth over a range is a range maximum, for k
+    boundaries in O(log k) and O(log^2 k) time.
+
+    The tree is stored bottom-up in a flat list, as in the usual
+    non-recursive segment tree with range increments: _max[p] is the
+    greatest depth below node p, counting only increments at or below
+    p, and _pending[p] is the increment applied to all of node p.
+    Increments are never pushed down, so a query adds up the ones
+    pending above each node it uses.
+
+        >>> depths = DepthTree([0, 1, 3, 6], [1, 2, 1, 0])
+        >>> depths.max_depth(0, 6), depths.max_depth(3, 10)
+        (2, 1)
+        >>> depths.add(0, 3, 1)
+        True
+        >>> depths.max_depth(0, 1)
+        2
+        >>> depths.add(0, 2, 1)  # 2 is not a boundary
+        False
+    """
+    def __init__(self, bounds, depths):
+        """
+        Builds the tree from the sorted boundaries and the depth of
+        each segment starting at a boundary; depths[-1], past the last
+        boundary, is ignored.
+
+        Completes in O(k) time.
+        """
+        self.bounds = list(bounds)
+        self.index = dict((bound, i) for i, bound in enumerate(self.bounds))
+        size = max(len(self.bounds) - 1, 1)
+        self._size = size
+        self._max = [0] * size + list(depths[:size])
+        self._max.extend([0] * (2 * size - len(self._max)))
+        self._pending = [0] * size
+        for p in range(size - 1, 0, -1):
+            self._max[p] = max(self._max[2 * p], self._max[2 * p + 1])
+
+    def _apply(self, p, delta):
+        self._max[p] += delta
+        if p < self._size:
+            self._pending[p] += delta
+
+    def _pull(self, p):
+        """
+        Recomputes the ancestors of node p from their children.
+        """
+        t, pending = self._max, self._pending
+        while p > 1:
+            p >>= 1
+            t[p] = max(t[2 * p], t[2 * p + 1]) + pending[p]
+
+    def _pending_above(self, p):
+        """
+        Returns the sum of the increments pending on the ancestors of
+        node p.
+        """
+        pending = self._pending
+        total = 0
+        p >>= 1
+        while p:
+            total += pending[p]
+            p >>= 1
+        return total
+
+    def add(self, begin, end, delta):
+        """
+        Adds delta to the depth of every segment in [begin, end).
+        Returns False, changing nothing, if begin or end is not a
+        boundary of the tree.
+
+        Completes in O(log k) time.
+        :rtype: bool
+        """
+        lo = self.index.get(begin)
+        hi = self.index.get(end)
+        if lo is None or hi is None:
+            return False
+        lo += self._size
+        hi += self._size
+        first, last = lo, hi - 1
+        while lo < hi:
+            if lo & 1:
+                self._apply(lo, delta)
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                self._apply(hi, delta)
+            lo >>= 1
+            hi >>= 1
+        self._pull(first)
+        self._pull(last)
+        return True
+
+    def max_depth(self, begin, end):
+        """
+        Returns the greatest depth of the segments overlapping [begin,
+        end), or 0 if none do. Only reads the tree, so queries may run
+        concurrently with each other.
+
+        Completes in O(log^2 k) time.
+        :rtype: int
+        """
+        if begin >= end:
+            return 0
+        bounds = self.bounds
+        lo = max(bisect_right(bounds, begin) - 1, 0)
+        hi = min(bisect_left(bounds, end), len(bounds) - 1)
+        if lo >= hi:
+            return 0
+        lo += self._size
+        hi += self._size
+        t = self._max
+        result = 0
+        while lo < hi:
+            if lo & 1:
+                result = max(result, t[lo] + self._pending_above(lo))
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                result = max(result, t[hi] + self._pending_above(hi))
+            lo >>= 1
+            hi >>= 1
+        return result
@@ -0,0 +1,634 @@
+"""
+intervaltree: A mutable, self-balancing interval tree for Python 2 and 3.
+Queries may be by point, by range overlap, or by range envelopment.
+
+Immutable, array-backed interval tree. Requires NumPy.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from interval import Interval, range_key
+from itertools import repeat
+from numbers import Number
+import json
+import os
+import pickle
+import struct
+import weakref
+import numpy as np
+
+
+# File format of FrozenIntervalTree.save(): the magic string, the
+# length of a JSON header as a little-endian uint64, the header, and
+# then the sections it lists, each starting on a _ALIGN-byte boundary.
+# The begins, ends and max_ends sections hold raw arrays of the dtype
+# recorded for each; the data section, present only if some data field
+# is not None, holds a pickled list of the data fields.
+_MAGIC = b'IVTREE\x00\x01'
+_ALIGN = 64
+_ARRAYS = ('begins', 'ends', 'max_ends')
+
+
+class FrozenIntervalTree(object):
+    """
+    A read-only counterpart of IntervalTree, for trees that are built
+    once and then only queried.
+
+    Intervals are kept as three parallel arrays sorted by begin:
+    begins and ends (numeric), and data (object). A fourth array holds
+    the running maximum of ends. Queries answer with the same sets of
+    Intervals as IntervalTree; the Interval objects are created on
+    demand from the arrays.
+
+    A query for [begin, end) only needs to look at the intervals with
+    an index in [lo, hi), where hi is the first interval beginning at
+    or after end, and lo is the first interval whose running maximum
+    end passes begin. That window is filtered with one vectorized
+    comparison.
+
+    save() writes the arrays to a file that load() maps back into
+    memory, so a stored tree can be queried without being rebuilt.
+
+        >>> from intervaltree import IntervalTree
+        >>> tree = IntervalTree([Interval(-1.1, 1.1), Interval(-0.5, 1.5), Interval(0.5, 1.7)])
+        >>> frozen = tree.freeze()
+        >>> frozen
+        FrozenIntervalTree([Interval(-1.1, 1.1), Interval(-0.5, 1.5), Interval(0.5, 1.7)])
+        >>> assert frozen[-1.1] == tree[-1.1]
+        >>> assert frozen[-0.5:0.5] == tree[-0.5:0.5]
+        >>> assert frozen.search(-0.4, 1.7, strict=True) == set([Interval(0.5, 1.7)])
+        >>> frozen.overlaps(1.7), frozen.overlaps(-1.2, -1.0)
+        (False, True)
+        >>> frozen.thaw() == tree
+        True
+    """
+    __slots__ = ('begins', 'ends', 'max_ends', '_data', '_load_data',
+                 '_shared_arrays', '__weakref__')
+
+    def __init__(self, intervals=None):
+        """
+        Set up a frozen tree from an iterable of Intervals.
+
+        Completes in O(n*log n) time.
+        """
+        ivs = sorted(set(intervals or ()), key=range_key)
+        self._set_arrays(
+            np.array([iv.begin for iv in ivs]),
+            np.array([iv.end for iv in ivs]),
+            [iv.data for iv in ivs]
+        )
+
+    @classmethod
+    def from_sorted_arrays(cls, begins, ends, data=None):
+        """
+        Create a FrozenIntervalTree from parallel arrays of begins,
+        ends and, optionally, data fields. The arrays must be sorted by
+        begin and must not hold duplicate intervals. The arrays are
+        copied.
+
+        Completes in O(n) time.
+        :rtype: FrozenIntervalTree
+        """
+        tree = cls.__new__(cls)
+        tree._set_arrays(np.array(begins), np.array(ends), data)
+        return tree
+
+    def _set_arrays(self, begins, ends, data):
+        if len(begins) != len(ends):
+            raise ValueError("FrozenIntervalTree: begins and ends differ in length")
+        if np.any(begins >= ends):
+            i = np.argmax(begins >= ends)
+            iv = Interval(begins[i].item(), ends[i].item())
+            raise ValueError(
+                "IntervalTree: Null Interval objects not allowed in IntervalTree:"
+                " {0}".format(iv)
+            )
+        if np.any(begins[1:] < begins[:-1]):
+            raise ValueError("FrozenIntervalTree: begins are not sorted")
+        data_array = np.empty(len(begins), dtype=object)
+        if data is not None:
+            data_array[:] = list(data)
+        self.begins = begins
+        self.ends = ends
+        if ends.dtype.kind in 'biufmMO':
+            self.max_ends = np.maximum.accumulate(ends) if len(ends) else ends
+        else:
+            # np.maximum has no loop for strings and other non-numeric
+            # dtypes; take the running maximum with Python comparisons.
+            self.max_ends = np.maximum.accumulate(ends.astype(object))
+        self._data = data_array
+        self._load_data = None
+        self._shared_arrays = None  # see parallel_search()
+        for array in (self.begins, self.ends, self._data, self.max_ends):
+            array.flags.writeable = False
+
+    @property
+    def data(self):
+        """
+        The data fields, as an object array parallel to begins and
+        ends. For a tree opened with load(), they are read from the
+        file on first use.
+        :rtype: numpy.ndarray
+        """
+        if self._data is None:
+            data_array = np.empty(len(self.begins), dtype=object)
+            if self._load_data is not None:
+                data_array[:] = self._load_data()
+            data_array.flags.writeable = False
+            self._data = data_array
+            self._load_data = None
+        return self._data
+
+    def _numeric_arrays(self, action):
+        """
+        Returns begins, ends and max_ends as contiguous arrays, by name.
+        Raises ValueError if they are not numeric.
+        :rtype: dict of [str, numpy.ndarray]
+        """
+        arrays = {}
+        for name in _ARRAYS:
+            array = np.ascontiguousarray(getattr(self, name))
+            if array.dtype.kind not in 'iuf':
+                raise ValueError(
+                    "FrozenIntervalTree: cannot {0} non-numeric {1}".format(
+                        action, name))
+            arrays[name] = array
+        return arrays
+
+    def save(self, path):
+        """
+        Writes the tree to the file at path, in a binary format that
+        load() can map into memory: begins, ends and max_ends as raw
+        numeric arrays, and the data fields pickled in a section of
+        their own. Raises ValueError if begins or ends are not numeric.
+
+        Completes in O(n) time.
+        """
+        arrays = self._numeric_arrays('save')
+        data = self.data
+        if any(d is not None for d in data):
+            payload = pickle.dumps(list(data), pickle.HIGHEST_PROTOCOL)
+        else:
+            payload = None
+
+        # Lay out the sections, leaving room for the header; its size
+        # depends on the offsets, so grow the room until it fits.
+        room = _ALIGN
+        while True:
+            header = {'version': 1, 'count': len(self), 'sections': {}}
+            offset = room
+            for name in _ARRAYS:
+                header['sections'][name] = {
+                    'offset': offset, 'dtype': arrays[name].dtype.str}
+                offset = _aligned(offset + arrays[name].nbytes)
+            if payload is not None:
+                header['sections']['data'] = {
+                    'offset': offset, 'length': len(payload)}
+            encoded = json.dumps(header, sort_keys=True).encode('utf-8')
+            if len(_MAGIC) + 8 + len(encoded) <= room:
+                break
+            room = _aligned(len(_MAGIC) + 8 + len(encoded))
+
+        with open(path, 'wb') as f:
+            f.write(_MAGIC)
+            f.write(struct.pack('<Q', len(encoded)))
+            f.write(encoded)
+            for name in _ARRAYS:
+                f.seek(header['sections'][name]['offset'])
+                f.write(arrays[name].tobytes())
+            if payload is not None:
+                f.seek(header['sections']['data']['offset'])
+                f.write(payload)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Opens a tree written by save(). If mmap is True, the arrays are
+        mapped from the file instead of being read, so the tree can be
+        queried at once, paging in only the parts a query touches. The
+        data fields are read on first use in either case.
+
+        Completes in O(1) time if mmap is True, O(n) time otherwise.
+        :rtype: FrozenIntervalTree
+        """
+        with open(path, 'rb') as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(
+                    "FrozenIntervalTree: {0} is not a saved tree".format(path))
+            length, = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(length).decode('utf-8'))
+            count = header['count']
+            sections = header['sections']
+            arrays = {}
+            for name in _ARRAYS:
+                dtype = np.dtype(sections[name]['dtype'])
+                offset = sections[name]['offset']
+                if not count:
+                    arrays[name] = np.empty(0, dtype=dtype)
+                elif mmap:
+                    arrays[name] = np.memmap(path, dtype=dtype, mode='r',
+                                             offset=offset, shape=(count,))
+                else:
+                    f.seek(offset)
+                    arrays[name] = np.fromfile(f, dtype=dtype, count=count)
+
+        tree = cls.__new__(cls)
+        tree.begins = arrays['begins']
+        tree.ends = arrays['ends']
+        tree.max_ends = arrays['max_ends']
+        tree._data = None
+        tree._load_data = None
+        tree._shared_arrays = None
+        if 'data' in sections:
+            offset = sections['data']['offset']
+            length = sections['data']['length']
+
+            def load_data():
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    return pickle.loads(f.read(length))
+            tree._load_data = load_data
+        for array in (tree.begins, tree.ends, tree.max_ends):
+            array.flags.writeable = False
+        return tree
+
+    def _intervals(self, indices):
+        """
+        Builds a set of the Intervals stored at indices.
+        :rtype: set of Interval
+        """
+        return set(map(Interval, self.begins[indices].tolist(),
+                       self.ends[indices].tolist(), self.data[indices]))
+
+    def search_indices(self, begin, end=None, strict=False):
+        """
+        Like search(), but returns the array positions of the matching
+        intervals, in ascending order, instead of a set of Intervals.
+        :rtype: numpy.ndarray
+        """
+        begins, ends = self.begins, self.ends
+        if end is None:
+            # a point is contained iff begin <= point < end
+            hi = np.searchsorted(begins, begin, 'right')
+            lo = np.searchsorted(self.max_ends, begin, 'right')
+            return lo + np.flatnonzero(ends[lo:hi] > begin)
+        if begin >= end:
+            return np.empty(0, dtype=np.intp)
+        if strict:
+            lo = np.searchsorted(begins, begin, 'left')
+            hi = np.searchsorted(begins, end, 'left')
+            return lo + np.flatnonzero(ends[lo:hi] <= end)
+        hi = np.searchsorted(begins, end, 'left')
+        lo = np.searchsorted(self.max_ends, begin, 'right')
+        return lo + np.flatnonzero(ends[lo:hi] > begin)
+
+    def search(self, begin, end=None, strict=False):
+        """
+        Returns a set of all intervals overlapping the given range. Or,
+        if strict is True, returns the set of all intervals fully
+        contained in the range [begin, end].
+
+        Completes in O(log n + w) time, where w is the size of the
+        scanned window (m, the number of matches, for trees without
+        long intervals shadowing short ones).
+        :rtype: set of Interval
+        """
+        if end is None and not isinstance(begin, Number):
+            try:
+                return self.search(begin.begin, begin.end, strict=strict)
+            except AttributeError:
+                pass
+        return self._intervals(self.search_indices(begin, end, strict))
+
+    def overlaps(self, begin, end=None):
+        """
+        Returns whether some interval in the tree overlaps the given
+        point or range.
+        :rtype: bool
+        """
+        if end is not None:
+            return self.overlaps_range(begin, end)
+        elif isinstance(begin, Number):
+            return self.overlaps_point(begin)
+        else:
+            return self.overlaps_range(begin.begin, begin.end)
+
+    def overlaps_point(self, p):
+        """
+        Returns whether some interval in the tree overlaps p.
+
+        Completes in O(log n) time.
+        :rtype: bool
+        """
+        # Of the intervals beginning at or before p, the one reaching
+        # furthest ends at max_ends[hi - 1].
+        hi = np.searchsorted(self.begins, p, 'right')
+        return bool(hi > 0 and self.max_ends[hi - 1] > p)
+
+    def overlaps_range(self, begin, end):
+        """
+        Returns whether some interval in the tree overlaps the given
+        range. Returns False if given a null interval over which to
+        test.
+
+        Completes in O(log n) time.
+        :rtype: bool
+        """
+        if begin >= end or not len(self):
+            return False
+        hi = np.searchsorted(self.begins, end, 'left')
+        return bool(hi > 0 and self.max_ends[hi - 1] > begin)
+
+    def begin(self):
+        """
+        Returns the lower bound of the first interval in the tree.
+
+        Completes in O(1) time.
+        """
+        if not len(self):
+            return 0
+        return self.begins[0].item()
+
+    def end(self):
+        """
+        Returns the upper bound of the last interval in the tree.
+
+        Completes in O(1) time.
+        """
+        if not len(self):
+            return 0
+        return self.max_ends[-1].item()
+
+    def share(self):
+        """
+        Copies the arrays of the tree, but not its data fields, into
+        shared memory, so that other processes can query the tree
+        without copying or rebuilding it; see SharedIntervalArrays.
+        Raises ValueError if the interval bounds are not numeric.
+
+        Completes in O(n) time.
+        Requires Python 3.8 or later.
+        :rtype: SharedIntervalArrays
+        """
+        return SharedIntervalArrays(self._numeric_arrays('share'))
+
+    def parallel_search(self, queries, workers=None, strict=False,
+                        as_indices=False):
+        """
+        Runs search() for every query in queries, each a point or a
+        (begin, end) pair such as an Interval, across a pool of worker
+        processes, and returns the results in order as a list of sets
+        of Intervals.
+
+        The tree is shared with the workers through share(), so each
+        worker attaches to it instead of receiving a copy. The shared
+        copy is made on the first call and kept for later ones, until
+        the tree is garbage collected. Queries are
+        split into a few chunks per worker; a worker answers a chunk
+        with array positions (see search_indices()), which are turned
+        into Intervals here. If as_indices is True, those arrays of
+        positions are returned instead, skipping that step.
+
+        workers defaults to the number of CPUs.
+        Requires Python 3.8 or later.
+        :rtype: list of set of Interval, or list of numpy.ndarray
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        queries = list(queries)
+        workers = workers or os.cpu_count() or 1
+        size = max(-(-len(queries) // (4 * workers)), 1)
+        chunks = [queries[i:i + size] for i in range(0, len(queries), size)]
+
+        shared = self._shared_arrays
+        if shared is None:
+            shared = self._shared_arrays = self.share()
+            weakref.finalize(self, shared.unlink)
+
+        results = []
+        with ProcessPoolExecutor(workers, initializer=_attach_worker,
+                                 initargs=(shared,)) as pool:
+            for offsets, indices in pool.map(_search_chunk, chunks,
+                                             repeat(strict)):
+                results.extend(np.split(indices, offsets[1:-1]))
+        if as_indices:
+            return results
+        return [self._intervals(indices) for indices in results]
+
+    def thaw(self):
+        """
+        Returns a mutable IntervalTree with the same intervals.
+        :rtype: IntervalTree
+        """
+        from intervaltree import IntervalTree
+        return IntervalTree.from_sorted_arrays(self.begins, self.ends, self.data)
+
+    def __getitem__(self, index):
+        """
+        Returns a set of all intervals overlapping the given index or
+        slice.
+        :rtype: set of Interval
+        """
+        try:
+            start, stop = index.start, index.stop
+            if start is None:
+                start = self.begin()
+                if stop is None:
+                    return set(self)
+            if stop is None:
+                stop = self.end()
+            return self.search(start, stop)
+        except AttributeError:
+            return self.search(index)
+
+    def __contains__(self, item):
+        """
+        Returns whether item exists as an Interval in the tree.
+
+        Completes in O(log n + k) time, where k is the number of
+        intervals sharing item's begin.
+        :rtype: bool
+        """
+        lo = np.searchsorted(self.begins, item.begin, 'left')
+        hi = np.searchsorted(self.begins, item.begin, 'right')
+        for i in range(lo, hi):
+            if self.ends[i] == item.end and self.data[i] == item.data:
+                return True
+        return False
+
+    def __iter__(self):
+        """
+        Returns an iterator over all the intervals in the tree, in
+        ascending order of begin.
+        :rtype: collections.Iterable[Interval]
+        """
+        return map(Interval, self.begins.tolist(), self.ends.tolist(),
+                   self.data)
+
+    def __len__(self):
+        return len(self.begins)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, FrozenIntervalTree) and
+            set(self) == set(other)
+        )
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        """
+        :rtype: str
+        """
+        ivs = sorted(self)
+        if not ivs:
+            return "FrozenIntervalTree()"
+        else:
+            return "FrozenIntervalTree({0})".format(ivs)
+
+    __str__ = __repr__
+
+    def __reduce__(self):
+        """
+        For pickle-ing.
+        :rtype: tuple
+        """
+        return FrozenIntervalTree.from_sorted_arrays, (
+            np.asarray(self.begins), np.asarray(self.ends), list(self.data))
+
+
+def _aligned(offset):
+    """
+    Rounds offset up to a multiple of _ALIGN.
+    """
+    return -(-offset // _ALIGN) * _ALIGN
+
+
+class SharedIntervalArrays(object):
+    """
+    The begins, ends and max_ends arrays of a FrozenIntervalTree,
+    copied into blocks of shared memory by FrozenIntervalTree.share().
+
+    Pickling this object only records the names of the blocks;
+    unpickling it, in another process, attaches to them. tree() then
+    gives a FrozenIntervalTree over the shared arrays. Its data fields
+    are all None, so search_indices() is the way to query it.
+
+    The blocks stay allocated until the creating process calls
+    unlink(), or leaves a with block:
+
+        with frozen.share() as shared:
+            ...  # pass shared to other processes
+
+    Requires Python 3.8 or later.
+    """
+    def __init__(self, arrays=None, spec=None):
+        from multiprocessing import shared_memory
+        self._blocks = {}
+        self._owner = spec is None
+        if spec is None:
+            spec = {'count': len(arrays['begins']), 'arrays': {}}
+            for name in _ARRAYS:
+                array = arrays[name]
+                block = shared_memory.SharedMemory(
+                    create=True, size=max(array.nbytes, 1))
+                np.ndarray(array.shape, array.dtype, buffer=block.buf)[:] = array
+                self._blocks[name] = block
+                spec['arrays'][name] = (block.name, array.dtype.str)
+        else:
+            for name, (block_name, _) in spec['arrays'].items():
+                try:
+                    # Only the creator should track, and so unlink, the block.
+                    block = shared_memory.SharedMemory(block_name, track=False)
+                except TypeError:  # before Python 3.13
+                    block = shared_memory.SharedMemory(block_name)
+                self._blocks[name] = block
+        self.spec = spec
+
+    def tree(self):
+        """
+        Returns a read-only FrozenIntervalTree whose arrays are views
+        of the shared blocks.
+        :rtype: FrozenIntervalTree
+        """
+        count = self.spec['count']
+        tree = FrozenIntervalTree.__new__(FrozenIntervalTree)
+        for name, (_, dtype) in self.spec['arrays'].items():
+            array = np.ndarray((count,), np.dtype(dtype),
+                               buffer=self._blocks[name].buf)
+            array.flags.writeable = False
+            setattr(tree, name, array)
+        tree._data = None
+        tree._load_data = None
+        tree._shared_arrays = None
+        return tree
+
+    def unlink(self):
+        """
+        Frees the shared blocks. Only the creating process may call
+        this, once no tree() views of them are in use.
+        """
+        for block in self._blocks.values():
+            block.close()
+            if self._owner:
+                block.unlink()
+        self._blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.unlink()
+
+    def __reduce__(self):
+        """
+        For pickle-ing: attach to the same blocks.
+        :rtype: tuple
+        """
+        return _attach_shared, (self.spec,)
+
+
+def _attach_shared(spec):
+    return SharedIntervalArrays(spec=spec)
+
+
+# The shared tree a parallel_search() worker process queries; set by
+# _attach_worker() when the worker starts.
+_worker_shared = None
+_worker_tree = None
+
+
+def _attach_worker(shared):
+    global _worker_shared, _worker_tree
+    _worker_shared = shared  # keeps the blocks mapped
+    _worker_tree = shared.tree()
+
+
+def _search_chunk(queries, strict):
+    """
+    Answers a chunk of parallel_search() queries in a worker. Returns
+    (offsets, indices): the positions found for queries[i] are
+    indices[offsets[i]:offsets[i + 1]].
+    """
+    found = []
+    for query in queries:
+        if isinstance(query, Number):
+            found.append(_worker_tree.search_indices(query))
+        else:
+            found.append(_worker_tree.search_indices(query[0], query[1], strict))
+    offsets = np.zeros(len(found) + 1, dtype=np.intp)
+    np.cumsum([len(indices) for indices in found], out=offsets[1:])
+    if not found:
+        return offsets, np.empty(0, dtype=np.intp)
+    return offsets, np.concatenate(found)
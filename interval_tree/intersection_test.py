@@ -8,11 +8,10 @@
 
 import sys
 from intervaltree import Interval, IntervalTree
-from copy import deepcopy
+from copy import copy
 from functools import total_ordering
 from collections import OrderedDict
 from itertools import count as iter_count
-from itertools import product as iter_product
 
 
 @total_ordering
@@ -22,7 +21,17 @@ class Reach:
         self.name = name
         self.llx, self.lly = llx, lly
         self.urx, self.ury = urx, ury
+
+        self.id = None      # Dense sink id, set by Partitioner.add_sink()
     
+    @property
+    def bit(self):
+        ''' The bit of this sink in a node mask. '''
+        if self.id is None:
+            raise ValueError("Sink %s has no id; add it with "
+                             "Partitioner.add_sink() first." % self.name)
+        return 1 << self.id
+
     @property
     def width(self):
         return self.urx-self.llx
@@ -124,36 +133,73 @@ class Node:
     ''' This class represents a node in a topology search graph. Each node has 
     a unique id, a list of sinks (essentially a map), and the bounding box of 
     its movable region.
+
+    The sinks are also kept as a bitmask over sink ids (bit i is set if the
+    node has the sink whose id is i), so subset, intersection and size tests
+    are single integer operations. The name and the hash are cached until the
+    sinks change.
     '''
     id_generator = iter_count(0)
     def __init__(self, sink_set, llx=None, urx=None, lly=None, ury=None):
         self.sink_dict = {s.name : s for s in sink_set}
+        self.mask = 0
+        for s in self.sink_dict.values():
+            self.mask |= s.bit
 
         self.llx, self.urx = llx, urx
         self.lly, self.ury = lly, ury
 
         self.id = next(Node.id_generator)
-    
+        self._name, self._hash = None, None
+
+    def _sinks_changed(self):
+        ''' Drop the cached name and hash. '''
+        self._name, self._hash = None, None
+
     def add_sink(self, s):
         ''' Add a sink to the sink_dict. '''
         self.sink_dict[s.name] = s
-   
+        self.mask |= s.bit
+        self._sinks_changed()
+
     def remove_sinks(self, sinks):
         ''' Remove sinks from the node. '''
-        for s in sinks:
-            if s.name in self.sink_dict:
-                del self.sink_dict[s.name]
-            else:
-                pass  # the sink is not included in this node.
+        self.remove_sinks_by_name_set([s.name for s in sinks])
 
     def remove_sinks_by_name_set(self, name_set):
         ''' Remove sinks (given by a set of sink names) from the node. '''
         for name in name_set:
             if name in self.sink_dict:
-                del self.sink_dict[name]
+                self.mask &= ~self.sink_dict.pop(name).bit
+                self._sinks_changed()
             else:
                 pass  # the sink is not included in this node.
 
+    def remove_sinks_by_mask(self, mask):
+        ''' Remove the sinks whose bits are set in mask from the node. '''
+        if self.mask & mask:
+            self.sink_dict = {name : s for name, s in self.sink_dict.items() \
+                              if not (mask >> s.id) & 1}
+            self.mask &= ~mask
+            self._sinks_changed()
+
+    def restricted(self, mask):
+        ''' Return a copy of the node keeping only the sinks whose bits are
+        set in mask. The copy keeps the id and the movable region.
+        '''
+        node = copy(self)
+        node.sink_dict = dict(self.sink_dict)
+        node.remove_sinks_by_mask(self.mask & ~mask)
+        return node
+
+    def issubset(self, other):
+        ''' Return true if every sink of this node is in the other node. '''
+        return self.mask & ~other.mask == 0
+
+    def intersects(self, other):
+        ''' Return true if the two nodes share a sink. '''
+        return self.mask & other.mask != 0
+
     def update_movable_region(self, source):
         ''' Update movable region of this node. '''
         llx_list, lly_list = [source.llx], [source.lly]
@@ -185,7 +231,9 @@ class Node:
 
     @property
     def name(self):
-        return '&&'.join(self.sink_name_list)
+        if self._name is None:
+            self._name = '&&'.join(self.sink_name_list)
+        return self._name
 
     def __repr__(self):
         try:
@@ -197,10 +245,16 @@ class Node:
     __str__ = __repr__
 
     def __hash__(self):
-        return hash(self.name)
+        # Hash the name rather than the mask, so that nodes keep the same
+        # order in a NodeSet whatever ids their sinks get.
+        if self._hash is None:
+            self._hash = hash(self.name)
+        return self._hash
 
     def __eq__(self, other):
-        return self.__hash__() == other.__hash__()
+        if not isinstance(other, Node):
+            return NotImplemented
+        return self.mask == other.mask
     
     def __lt__(self, other):
         return self.area < other.area
@@ -214,26 +268,142 @@ class Node:
 
 
 class NodeSet(set):
-    ''' A set of nodes (derived from set). '''
+    ''' A set of nodes (derived from set).
+
+    An inverted index maps each sink name to the nodes containing the sink,
+    keyed by node id, so that looking up or removing a sink only touches the
+    nodes that contain it. Every method and in-place operator that changes
+    the set, and remove_sink_from_nodes(), keeps the index up to date; the
+    sinks of a node must not be changed otherwise while it is in the set.
+    '''
     def __init__(self):
         super().__init__()
+        self.nodes_by_sink = dict()     # Key: sink name
+                                        # Value: a dict of node id to node
+
+    def _index(self, n):
+        for name in n.sink_dict:
+            self.nodes_by_sink.setdefault(name, dict())[n.id] = n
+
+    def _unindex(self, n):
+        for name in n.sink_dict:
+            nodes = self.nodes_by_sink.get(name)
+            if nodes is not None:
+                nodes.pop(n.id, None)
+                if len(nodes) == 0:
+                    del self.nodes_by_sink[name]
+
+    def _stored(self, n):
+        ''' Return the node of this set equal to n, which may be another
+        object than n.
+        '''
+        if len(n) == 0:
+            return n    # An empty node is not in the index
+        name = min(n.sink_dict, key=lambda t: len(self.nodes_by_sink[t]))
+        for m in self.nodes_by_sink[name].values():
+            if m == n:
+                return m
+
+    def add(self, n):
+        if n not in self:
+            super().add(n)
+            self._index(n)
+
+    def remove(self, n):
+        if n not in self:
+            raise KeyError(n)
+        self._unindex(self._stored(n))
+        super().remove(n)
+
+    def discard(self, n):
+        if n in self:
+            self.remove(n)
+
+    def pop(self):
+        n = super().pop()
+        self._unindex(n)
+        return n
+
+    def clear(self):
+        super().clear()
+        self.nodes_by_sink.clear()
+
+    def update(self, *others):
+        for nodes in others:
+            for n in nodes:
+                self.add(n)
+
+    def difference_update(self, *others):
+        for nodes in others:
+            for n in list(nodes):
+                self.discard(n)
+
+    def intersection_update(self, *others):
+        kept = set(self)
+        for nodes in others:
+            kept = kept.intersection(nodes)
+        for n in [n for n in self if n not in kept]:
+            self.remove(n)
+
+    def symmetric_difference_update(self, other):
+        for n in set(other):
+            if n in self:
+                self.remove(n)
+            else:
+                self.add(n)
+
+    # The in-place operators of set bypass the methods above, so route
+    # them through those methods to keep the index up to date.
+    def __ior__(self, other):
+        if not isinstance(other, (set, frozenset)):
+            return NotImplemented
+        self.update(other)
+        return self
+
+    def __iand__(self, other):
+        if not isinstance(other, (set, frozenset)):
+            return NotImplemented
+        self.intersection_update(other)
+        return self
+
+    def __isub__(self, other):
+        if not isinstance(other, (set, frozenset)):
+            return NotImplemented
+        self.difference_update(other)
+        return self
+
+    def __ixor__(self, other):
+        if not isinstance(other, (set, frozenset)):
+            return NotImplemented
+        self.symmetric_difference_update(other)
+        return self
 
     def remove_sink_from_nodes(self, s):
-        ''' Remove a sink from every node contained in this set. '''
-        [n.remove_sinks([s]) for n in self]
-
-        # Eliminate empty nodes
-        empty_nodes = {n for n in self if len(n)==0}
-        self = self - empty_nodes
+        ''' Remove a sink from every node contained in this set. Nodes left
+        without a sink, or with the same sinks as another node of the set,
+        are removed from the set.
+        '''
+        bit = s.bit
+        for n in self.nodes_by_sink.pop(s.name, dict()).values():
+            # Take the node out while its hash still matches, then put it
+            # back with the sink removed.
+            super().remove(n)
+            n.remove_sinks_by_mask(bit)
+            if len(n) == 0 or n in self:
+                self._unindex(n)
+            else:
+                super().add(n)
 
     def get_nodes_by_sink(self, s):
         ''' Return every node containing a given sink. '''
-        return {n for n in self if s.name in n.sink_dict.keys()}
+        return set(self.nodes_by_sink.get(s.name, dict()).values())
 
     def get_nodes_by_sink_name(self, name):
         ''' Return the nodes containing a given sink name. '''
-        return [n for n in self \
-                if len(name.intersection(n.sink_dict.keys()))!=0]
+        nodes = dict()
+        for sink_name in name:
+            nodes.update(self.nodes_by_sink.get(sink_name, dict()))
+        return list(nodes.values())
 
     def get_nodes_sorted(self):
         ''' Return nodes in descending order of MR area. '''
@@ -254,6 +424,11 @@ class Partitioner:
         self.nodes = None       # Genearted nodes
         self.selected = None    # Selected nodes
 
+    def add_sink(self, s):
+        ''' Add a sink, giving it the next dense sink id. '''
+        s.id = len(self.sinks)
+        self.sinks.append(s)
+
     def initialize_interval_trees(self):
         print("Initializing interval trees.")
         print("#Sinks      : %d" % len(self.sinks))
@@ -273,47 +448,41 @@ class Partitioner:
             print("")
 
     def find_node_candidates(self, T, bounds, lb, ub):
-        crossed = list()
+        ''' Sweep the bounds from lb toward ub, and return a node for every
+        distinct set of sinks crossed on the way. The sinks crossed so far
+        are kept in a single dict, updated in place at each bound; each
+        node takes a snapshot of it, so no node is ever copied.
+        '''
         node_set = NodeSet()
-        node = None
 
         # Find intersection with the lower bound of source
-        for i in T[lb]:
-            crossed.append(i.data)
+        active = OrderedDict((i.data.name, i.data) for i in T.stab(lb))
 
-        if len(crossed) > 0:
-            node = Node(crossed)
-            node_set.add(node)
+        if len(active) > 0:
+            node_set.add(Node(active.values()))
 
         # Now, start searching toward upper bound
         for b in bounds.get_sorted_bounds():
             if b.is_lower_bound:
-                # We meet a lower bound of a sink; create a new node.
-                if node is None:
-                    node = Node(b.sinks)
-                else:
-                    node = deepcopy(node)       # Create copy and update sinks
-                    [node.add_sink(s) for s in b.sinks]
+                # We meet a lower bound of a sink; add its sinks.
+                for s in b.sinks:
+                    active[s.name] = s
 
-                node_set.add(node)
+                node_set.add(Node(active.values()))
 
             else:
-                # We meet an upper bound of a sink.
-                # Create a new node after removing sinks from current node.
-                try:
-                    assert node is not None
-                except AssertionError:
+                # We meet an upper bound of a sink; remove its sinks.
+                if len(active) == 0:
                     sys.stderr.write("node is None... exit.\n")
                     sys.exit(-1)
 
-                node = deepcopy(node)
-                node.remove_sinks(b.sinks)
+                for s in b.sinks:
+                    active.pop(s.name, None)
 
-                # If the node do not have a sink any more, make it invalid.
-                if len(node) == 0:
-                    node = None
-                else:
-                    node_set.add(node)
+                # If no sink is left, there is no node until the next
+                # lower bound.
+                if len(active) > 0:
+                    node_set.add(Node(active.values()))
 
         return node_set
 
@@ -337,22 +506,32 @@ class Partitioner:
             print(n)
         print("")
 
-        # Final node set
+        # Final node set: the non-empty intersections of an x-candidate
+        # and a y-candidate. Each candidate is a bitset over sink indices,
+        # and only the y-candidates sharing a sink with an x-candidate,
+        # found through an inverted index, are intersected with it.
         self.nodes = NodeSet()
 
-        remaining = set(self.sinks)
-        
-        for nx, ny in iter_product(Nx, Ny):
-            sinks_nx = nx.sink_set
-            sinks_ny = ny.sink_set
-
-            sinks_new = sinks_nx.intersection(sinks_ny)
-            # if sinks_new in [sinks_nx, sinks_ny]:
-            if len(sinks_new) > 0:
-                node_new = Node(sinks_new)
-                self.nodes.add(node_new)
-                
-                remaining = remaining - sinks_new
+        masks_x = [n.mask for n in Nx]
+        masks_y = [n.mask for n in Ny]
+
+        nodes_by_sink = [list() for _ in self.sinks]     # Sink -> y-candidates
+        for j, mask in enumerate(masks_y):
+            for i in self.mask_indices(mask):
+                nodes_by_sink[i].append(j)
+
+        found = set()
+        for mask_x in masks_x:
+            partners = set()
+            for i in self.mask_indices(mask_x):
+                partners.update(nodes_by_sink[i])
+
+            for j in sorted(partners):
+                mask_new = mask_x & masks_y[j]
+                if mask_new not in found:
+                    found.add(mask_new)
+                    self.nodes.add(Node([self.sinks[i] \
+                                         for i in self.mask_indices(mask_new)]))
 
         # Update movable region for each node
         [n.update_movable_region(self.source) for n in self.nodes]
@@ -363,6 +542,16 @@ class Partitioner:
         print("All the generated nodes:")
         [print("\t%d : %s" % (i+1, n)) for i,n in enumerate(self.nodes)]
 
+    @staticmethod
+    def mask_indices(mask):
+        ''' Return the sink indices set in a bitset, in ascending order. '''
+        indices = list()
+        while mask:
+            low = mask & -mask
+            indices.append(low.bit_length() - 1)
+            mask ^= low
+        return indices
+
     def select_nodes(self):
         import heapq
 
@@ -370,32 +559,38 @@ class Partitioner:
         print("Selecting nodes.")
 
         selected = list()
-        sink_names = {s.name for s in self.sinks}
-        candidates = {deepcopy(n) for n in self.nodes}
+        uncovered = 0
+        for s in self.sinks:
+            uncovered |= s.bit
 
-        print("Num candidates: %d" % (len(candidates)))
+        print("Num candidates: %d" % (len(self.nodes)))
 
-        # Priority: #sinks, area. 
+        # Priority: #sinks not covered yet, area.
         # If they are the same, use the one created earlir.
-        heap = [(-len(n), -n.area, n.id, n) for n in candidates]
-
-        while len(sink_names) > 0:
-            heapq.heapify(heap)
-
-            selected.append(heapq.heappop(heap)[-1])
+        # A node's sink count only drops as sinks get covered, so its key
+        # is refreshed lazily: when a popped node turns out to have lost
+        # sinks, it goes back into the heap with its current count, or is
+        # dropped if it has none left.
+        heap = [(-len(n), -n.area, n.id, n) for n in self.nodes]
+        heapq.heapify(heap)
+
+        while uncovered:
+            neg_count, neg_area, node_id, n = heapq.heappop(heap)
+            mask = n.mask & uncovered
+            count = bin(mask).count('1')
+            if count == 0:
+                continue    # Nothing left to cover; drop the node.
+            if count != -neg_count:
+                heapq.heappush(heap, (-count, neg_area, node_id, n))
+                continue
+
+            # Select the node, keeping only the sinks it newly covers.
+            selected.append(n.restricted(mask))
             print(selected[-1])
 
-            sink_covered = selected[-1].sink_name_list
-            sink_names = set(sink_names) - set(sink_covered)
-            
-            candidates = list()
-            for n in heap:
-                n[-1].remove_sinks_by_name_set(sink_covered)
-                if len(n) > 0:
-                    candidates.append(n[-1])
-
-            heap = [(-len(n), -n.area, n.id, n) for n in candidates]
+            uncovered &= ~mask
 
+        self.selected = selected
 
 if __name__ == '__main__':
     def read_input(partitioner, file_name):
@@ -411,7 +606,7 @@ if __name__ == '__main__':
             tokens = line.split()
             name = tokens[0]
             llx, lly, urx, ury = [float(t) for t in tokens[1:]]
-            partitioner.sinks.append(Reach(name, llx, lly, urx, ury))
+            partitioner.add_sink(Reach(name, llx, lly, urx, ury))
 
         # Set source
         tokens = lines[-1].split()
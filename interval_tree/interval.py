@@ -21,6 +21,7 @@ limitations under the License.
 """
 from numbers import Number
 from collections import namedtuple
+from operator import attrgetter
 
 
 # noinspection PyBroadException
@@ -39,17 +40,38 @@ class Interval(namedtuple('IntervalBase', ['begin', 'end', 'data'])):
         :rtype: bool
         """
         if end is not None:
-            return (
-                (begin <= self.begin < end) or
-                (begin < self.end <= end) or
-                (self.begin <= begin < self.end) or
-                (self.begin < end <= self.end)
-            )
+            return self.overlaps_range(begin, end)
+        if isinstance(begin, Number):
+            return self.contains_point(begin)
         try:
-            return self.overlaps(begin.begin, begin.end)
-        except:
+            return self.overlaps_range(begin.begin, begin.end)
+        except AttributeError:
             return self.contains_point(begin)
 
+    def overlaps_range(self, begin, end):
+        """
+        Whether the interval overlaps the range [begin, end).
+        :param begin: beginning point of the range
+        :param end: end point of the range
+        :return: True or False
+        :rtype: bool
+        """
+        if begin < end:
+            return self.begin < end and begin < self.end
+        # A null range overlaps if it reaches into the interval from
+        # either side.
+        return self.begin <= begin < self.end or self.begin < end <= self.end
+
+    def overlaps_point(self, p):
+        """
+        Whether the interval overlaps the point p. Same as
+        contains_point().
+        :param p: a point
+        :return: True or False
+        :rtype: bool
+        """
+        return self.begin <= p < self.end
+
     def contains_point(self, p):
         """
         Whether the Interval contains p.
@@ -99,7 +121,7 @@ class Interval(namedtuple('IntervalBase', ['begin', 'end', 'data'])):
             else:
                 return self.begin - other.end
         except:
-            if self.end < other:
+            if self.end <= other:
                 return other - self.end
             else:
                 return self.begin - other
@@ -177,20 +199,32 @@ class Interval(namedtuple('IntervalBase', ['begin', 'end', 'data'])):
 
     def __lt__(self, other):
         """
-        Less than operator. Parrots __cmp__()
+        Less than operator. Parrots __cmp__(), but compares two
+        Intervals with differing ranges directly, without slicing.
         :param other: Interval or point
         :return: True or False
         :rtype: bool
         """
+        if isinstance(other, Interval):
+            if self[0] != other[0]:
+                return self[0] < other[0]
+            if self[1] != other[1]:
+                return self[1] < other[1]
         return self.__cmp__(other) < 0
 
     def __gt__(self, other):
         """
-        Greater than operator. Parrots __cmp__()
+        Greater than operator. Parrots __cmp__(), but compares two
+        Intervals with differing ranges directly, without slicing.
         :param other: Interval or point
         :return: True or False
         :rtype: bool
         """
+        if isinstance(other, Interval):
+            if self[0] != other[0]:
+                return self[0] > other[0]
+            if self[1] != other[1]:
+                return self[1] > other[1]
         return self.__cmp__(other) > 0
 
     def _raise_if_null(self, other):
@@ -300,3 +334,8 @@ class Interval(namedtuple('IntervalBase', ['begin', 'end', 'data'])):
         :rtype: tuple
         """
         return Interval, self._get_fields()
+
+
+# Sort key for Intervals: by begin, then end. Much cheaper than sorting
+# the Intervals themselves, which compares data fields on ties.
+range_key = attrgetter('begin', 'end')
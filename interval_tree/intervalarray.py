@@ -0,0 +1,219 @@
+"""
+intervaltree: A mutable, self-balancing interval tree for Python 2 and 3.
+Queries may be by point, by range overlap, or by range envelopment.
+
+Columnar array of intervals. Requires NumPy.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from interval import Interval
+from itertools import repeat
+from numbers import Number
+import numpy as np
+
+
+class IntervalArray(object):
+    """
+    A sequence of intervals held as parallel arrays of begins, ends
+    and, optionally, data fields, instead of one Interval per element.
+
+    The Interval predicates are available in vectorized form: each
+    tests every interval of the array at once and returns a boolean
+    mask (or, for length() and distance_to(), an array of numbers).
+    Indexing with an integer returns an Interval; indexing with a
+    slice, a mask or an array of positions returns an IntervalArray.
+
+    IntervalTree(array) and tree.update(array) accept an IntervalArray
+    directly, sorting and checking it as arrays.
+
+        >>> ivs = IntervalArray([0, 5, 10], [4, 15, 12], ['a', 'b', 'c'])
+        >>> ivs.overlaps(3, 11).tolist()
+        [True, True, True]
+        >>> ivs.contains_point(11).tolist()
+        [False, True, True]
+        >>> ivs.distance_to(Interval(20, 30)).tolist()
+        [16, 5, 8]
+        >>> ivs[ivs.length() > 2]
+        IntervalArray([Interval(0, 4, 'a'), Interval(5, 15, 'b')])
+        >>> ivs[2]
+        Interval(10, 12, 'c')
+    """
+    __slots__ = ('begins', 'ends', 'data')
+
+    def __init__(self, begins, ends, data=None):
+        """
+        Set up an array from parallel sequences of begins, ends and,
+        optionally, data fields. NumPy arrays are used as they are,
+        without copying.
+
+        Completes in O(n) time.
+        """
+        begins = np.asarray(begins)
+        ends = np.asarray(ends)
+        if begins.ndim != 1 or begins.shape != ends.shape:
+            raise ValueError(
+                "IntervalArray: begins and ends must be 1-D and of equal length")
+        if data is not None:
+            data_array = np.empty(len(begins), dtype=object)
+            data_array[:] = list(data)
+            data = data_array
+        self.begins = begins
+        self.ends = ends
+        self.data = data
+
+    @classmethod
+    def from_intervals(cls, intervals):
+        """
+        Create an IntervalArray from an iterable of Intervals.
+
+        Completes in O(n) time.
+        :rtype: IntervalArray
+        """
+        ivs = list(intervals)
+        data = [iv.data for iv in ivs]
+        if all(d is None for d in data):
+            data = None
+        return cls([iv.begin for iv in ivs], [iv.end for iv in ivs], data)
+
+    def sorted(self):
+        """
+        Returns a copy of the array sorted by begin, then end.
+
+        Completes in O(n*log n) time.
+        :rtype: IntervalArray
+        """
+        return self[np.lexsort((self.ends, self.begins))]
+
+    def overlaps(self, begin, end=None):
+        """
+        Which intervals overlap the given point, range or Interval.
+        :param begin: beginning point of the range, or the point, or an Interval
+        :param end: end point of the range. Optional if not testing ranges.
+        :rtype: numpy.ndarray of bool
+        """
+        if end is not None:
+            return self.overlaps_range(begin, end)
+        if isinstance(begin, Number):
+            return self.contains_point(begin)
+        try:
+            return self.overlaps_range(begin.begin, begin.end)
+        except AttributeError:
+            return self.contains_point(begin)
+
+    def overlaps_range(self, begin, end):
+        """
+        Which intervals overlap the range [begin, end).
+        :rtype: numpy.ndarray of bool
+        """
+        if begin < end:
+            return (self.begins < end) & (begin < self.ends)
+        # A null range overlaps if it reaches into the interval from
+        # either side; see Interval.overlaps_range().
+        return (
+            ((self.begins <= begin) & (begin < self.ends)) |
+            ((self.begins < end) & (end <= self.ends))
+        )
+
+    def overlaps_point(self, p):
+        """
+        Which intervals overlap the point p. Same as contains_point().
+        :rtype: numpy.ndarray of bool
+        """
+        return self.contains_point(p)
+
+    def contains_point(self, p):
+        """
+        Which intervals contain p. p may also be an array of points,
+        one per interval.
+        :rtype: numpy.ndarray of bool
+        """
+        return (self.begins <= p) & (p < self.ends)
+
+    def range_matches(self, other):
+        """
+        Which intervals have the same begin and end as other.
+        :param other: Interval
+        :rtype: numpy.ndarray of bool
+        """
+        return (self.begins == other.begin) & (self.ends == other.end)
+
+    def contains_interval(self, other):
+        """
+        Which intervals contain other.
+        :param other: Interval
+        :rtype: numpy.ndarray of bool
+        """
+        return (self.begins <= other.begin) & (self.ends >= other.end)
+
+    def distance_to(self, other):
+        """
+        The size of the gap between each interval and other, or 0 where
+        they touch or overlap.
+        :param other: Interval or point
+        :rtype: numpy.ndarray
+        """
+        try:
+            begin, end = other.begin, other.end
+        except AttributeError:
+            begin = end = other
+        return np.maximum(np.maximum(begin - self.ends, self.begins - end), 0)
+
+    def is_null(self):
+        """
+        Which intervals are null, with end <= begin.
+        :rtype: numpy.ndarray of bool
+        """
+        return self.begins >= self.ends
+
+    def length(self):
+        """
+        The distance covered by each interval; 0 for null intervals.
+        :rtype: numpy.ndarray
+        """
+        return np.maximum(self.ends - self.begins, 0)
+
+    def __len__(self):
+        return len(self.begins)
+
+    def __iter__(self):
+        """
+        Returns an iterator over the intervals, as Interval objects.
+        :rtype: collections.Iterator[Interval]
+        """
+        data = self.data if self.data is not None else repeat(None)
+        return map(Interval, self.begins.tolist(), self.ends.tolist(), data)
+
+    def __getitem__(self, index):
+        """
+        Returns the Interval at an integer index, or an IntervalArray
+        of the intervals selected by a slice, a mask or an array of
+        positions.
+        :rtype: Interval or IntervalArray
+        """
+        if isinstance(index, (int, np.integer)):
+            data = self.data[index] if self.data is not None else None
+            return Interval(self.begins[index].item(),
+                            self.ends[index].item(), data)
+        array = IntervalArray.__new__(IntervalArray)
+        array.begins = self.begins[index]
+        array.ends = self.ends[index]
+        array.data = self.data[index] if self.data is not None else None
+        return array
+
+    def __repr__(self):
+        """
+        :rtype: str
+        """
+        return "IntervalArray({0})".format(list(self))
+
+    __str__ = __repr__
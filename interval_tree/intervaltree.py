@@ -19,20 +19,33 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-from interval import Interval
+from interval import Interval, range_key
 from node import Node
+from augmentednode import AugmentedNode
+from depthtree import DepthTree
 from numbers import Number
+from sorteddict import SortedDict
 import collections
-# from sortedcontainers import SortedDict
-from collections import OrderedDict 
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
 from copy import copy
+from heapq import heappop, heappush, merge
+from itertools import count, groupby, repeat
+from operator import attrgetter
 from warnings import warn
+import sys
 
 try:
     xrange  # Python 2?
 except NameError:  # pragma: no cover
     xrange = range
 
+# Node classes that IntervalTree(engine=...) can be built on
+ENGINES = {
+    'centered': Node,
+    'augmented': AugmentedNode,
+}
+
 
 # noinspection PyBroadException
 class IntervalTree(collections.MutableSet):
@@ -227,6 +240,16 @@ class IntervalTree(collections.MutableSet):
         True
         >>> IntervalTree([Interval(0, 1)]) == IntervalTree([Interval(0, 1, "x")])
         False
+
+    Engines::
+
+        >>> tree = IntervalTree([Interval(-1.1, 1.1), Interval(-0.5, 1.5), Interval(0.5, 1.7)],
+        ...                     engine="augmented")
+        >>> assert tree[-0.5:0.5] == set([Interval(-0.5, 1.5), Interval(-1.1, 1.1)])
+        >>> tree.overlaps(1.7, 1.8)
+        False
+        >>> tree == IntervalTree(tree)  # the engine doesn't affect equality
+        True
     """
     @classmethod
     def from_tuples(cls, tups):
@@ -237,35 +260,177 @@ class IntervalTree(collections.MutableSet):
         ivs = [Interval(*t) for t in tups]
         return IntervalTree(ivs)
 
-    def __init__(self, intervals=None):
+    @classmethod
+    def from_sorted_arrays(cls, begins, ends, data=None, engine='centered'):
+        """
+        Create a new IntervalTree from parallel sequences of begins,
+        ends and, optionally, data fields. The sequences should be
+        sorted by begin, then end; unsorted input is still accepted,
+        but pays for one extra sort.
+
+        Sorted input skips the sort of the intervals, but building the
+        nodes partitions the intervals once per tree level, and the
+        boundary table sorts the ends.
+
+        Completes in O(n*log n) time.
+        :rtype: IntervalTree
+        """
+        if hasattr(begins, 'tolist'):  # unbox NumPy scalars
+            begins = begins.tolist()
+        if hasattr(ends, 'tolist'):
+            ends = ends.tolist()
+        if data is None:
+            data = repeat(None)
+        ivs = [Interval(b, e, d) for b, e, d in zip(begins, ends, data)]
+        ivs.sort(key=range_key)  # linear if already sorted
+        tree = cls.__new__(cls)
+        tree._set_engine(engine)
+        tree._build_sorted(ivs)
+        return tree
+
+    def __init__(self, intervals=None, engine='centered'):
         """
         Set up a tree. If intervals is provided, add all the intervals 
         to the tree.
+
+        engine selects the internal tree:
+          * 'centered' (default): a centered interval tree, with the
+            intervals overlapping each node's center stored there.
+            Fastest for point queries.
+          * 'augmented': a tree keyed on begin, with each node holding
+            the greatest end of its subtree. Range queries take
+            O(log n + m) time regardless of how many boundaries fall in
+            the range, and removals never move intervals between
+            nodes.
         
+        intervals may also be an IntervalArray, which is sorted and
+        checked as arrays.
+
         Completes in O(n*log n) time.
         """
+        self._set_engine(engine)
+        array = _interval_array(intervals)
+        if array is not None:
+            self._build_sorted(self._sorted_from_array(array))
+            return
         intervals = set(intervals) if intervals is not None else set()
-        for iv in intervals:
+        self._build(intervals, sorted(intervals, key=range_key))
+
+    def _set_engine(self, engine):
+        """
+        Selects the Node class the tree is built from.
+        """
+        if engine not in ENGINES:
+            raise ValueError(
+                "IntervalTree: unknown engine {0!r}; expected one of {1}".format(
+                    engine, sorted(ENGINES))
+            )
+        self.engine = engine
+        self._node_class = ENGINES[engine]
+
+    def _build(self, intervals, sorted_intervals):
+        """
+        Sets up the tree from a set of intervals and a list of the
+        same intervals sorted by begin, then end.
+        """
+        for iv in sorted_intervals:
             if iv.is_null():
                 raise ValueError(
                     "IntervalTree: Null Interval objects not allowed in IntervalTree:"
                     " {0}".format(iv)
                 )
-        self.all_intervals = intervals
-        self.top_node = Node.from_intervals(self.all_intervals)
-        self.boundary_table = OrderedDict()
-        for iv in self.all_intervals:
-            self._add_boundaries(iv)
+        self.top_node = self._node_class.from_sorted_intervals(sorted_intervals)
+        self.boundary_table = self._boundaries_from_sorted(sorted_intervals)
+        self._count = len(intervals)
+        self._sorted = tuple(sorted_intervals)
+        self._endpoint_arrays = None
+        self._depth_tree = None
+        self._generation += 1
+
+    def _build_sorted(self, sorted_intervals):
+        """
+        Sets up the tree from a list of intervals sorted by begin, then
+        end, which may hold duplicates.
+        """
+        intervals = set(sorted_intervals)
+        if len(intervals) != len(sorted_intervals):  # drop duplicates, keeping order
+            seen = set()
+            sorted_intervals = [iv for iv in sorted_intervals
+                                if not (iv in seen or seen.add(iv))]
+        self._build(intervals, sorted_intervals)
+
+    @staticmethod
+    def _sorted_from_array(array):
+        """
+        Returns the intervals of an IntervalArray as a list of Intervals
+        sorted by begin, then end. Raises ValueError if any is null.
+        :rtype: list of Interval
+        """
+        null = array.is_null()
+        if null.any():
+            raise ValueError(
+                "IntervalTree: Null Interval objects not allowed in IntervalTree:"
+                " {0}".format(array[int(null.argmax())])
+            )
+        return list(array.sorted())
+
+    @staticmethod
+    def _boundaries_from_sorted(sorted_intervals):
+        """
+        Builds a boundary table from intervals sorted by begin, by
+        merging the begins with the sorted ends and counting runs.
+        :rtype: SortedDict
+        """
+        begins = [iv.begin for iv in sorted_intervals]
+        ends = sorted(iv.end for iv in sorted_intervals)
+        items = []
+        for bound in merge(begins, ends):
+            if items and items[-1][0] == bound:
+                items[-1][1] += 1
+            else:
+                items.append([bound, 1])
+        return SortedDict.from_sorted_items(items)
+
+    def _mutated(self):
+        """
+        Drops the cached views of the tree contents. Must be called
+        whenever an interval is added or removed.
+        """
+        self._sorted = None
+        self._endpoint_arrays = None
+        self._generation += 1
 
     def copy(self):
         """
-        Construct a new IntervalTree using shallow copies of the 
-        intervals in the source tree.
-        
-        Completes in O(n*log n) time.
+        Returns a copy of the tree that shares its structure with the
+        source: the nodes and the blocks of the boundary table.
+        Neither tree changes what they share. A change to either one
+        copies only the nodes on the changed path and the boundary
+        table block it touches, so it still costs O(log n) time.
+
+        Completes in O(n / SortedDict._load) time, for the boundary
+        table's list of blocks.
         :rtype: IntervalTree
         """
-        return IntervalTree(iv.copy() for iv in self)
+        tree = IntervalTree.__new__(IntervalTree)
+        tree.__dict__.update(self.__dict__)
+        tree.boundary_table = self.boundary_table.copy()
+        tree._depth_tree = None  # updated in place, so never shared
+        if self._cache is not None:
+            tree._cache = _QueryCache(self._cache.maxsize)
+        if self.top_node:
+            self.top_node.shared = True
+        return tree
+
+    @property
+    def all_intervals(self):
+        """
+        The intervals in the tree, as a read-only set view of the nodes.
+        Membership tests take O(log n) time; set operations on the view
+        return plain sets.
+        :rtype: collections.Set
+        """
+        return _IntervalSet(self)
     
     def _add_boundaries(self, interval):
         """
@@ -277,15 +442,15 @@ class IntervalTree(collections.MutableSet):
             self.boundary_table[begin] += 1
         else:
             self.boundary_table[begin] = 1
-            self.boundary_table = OrderedDict(sorted(self.boundary_table.items(), 
-                                                     key=lambda t:t[0]))
         
         if end in self.boundary_table:
             self.boundary_table[end] += 1
         else:
             self.boundary_table[end] = 1
-            self.boundary_table = OrderedDict(sorted(self.boundary_table.items(), 
-                                                     key=lambda t:t[0]))
+
+        depth_tree = self._depth_tree
+        if depth_tree is not None and not depth_tree.add(begin, end, 1):
+            self._depth_tree = None  # new boundary; rebuild when needed
 
     def _remove_boundaries(self, interval):
         """
@@ -302,6 +467,9 @@ class IntervalTree(collections.MutableSet):
             del self.boundary_table[end]
         else:
             self.boundary_table[end] -= 1
+
+        if self._depth_tree is not None:
+            self._depth_tree.add(begin, end, -1)
     
     def add(self, interval):
         """
@@ -319,11 +487,12 @@ class IntervalTree(collections.MutableSet):
             )
 
         if not self.top_node:
-            self.top_node = Node.from_interval(interval)
+            self.top_node = self._node_class.from_interval(interval)
         else:
             self.top_node = self.top_node.add(interval)
-        self.all_intervals.add(interval)
+        self._count += 1
         self._add_boundaries(interval)
+        self._mutated()
     append = add
     
     def addi(self, begin, end, data=None):
@@ -338,12 +507,84 @@ class IntervalTree(collections.MutableSet):
     def update(self, intervals):
         """
         Given an iterable of intervals, add them to the tree.
+
+        intervals may also be an IntervalArray. If it is large enough
+        for the tree to be rebuilt, it is sorted as arrays and merged
+        with the sorted intervals of the tree.
         
         Completes in O(m*log(n+m), where m = number of intervals to 
-        add.
+        add, or in O((n+m)*log(n+m)) if the tree is rebuilt; see
+        apply().
+        """
+        array = _interval_array(intervals)
+        if array is not None and len(array) > self.rebuild_ratio * len(self):
+            added = self._sorted_from_array(array)
+            self._build_sorted(
+                list(merge(self.sorted_intervals(), added, key=range_key)))
+            return
+        self.apply(adds=intervals)
+
+    # apply() rebuilds the tree, instead of editing it one interval at
+    # a time, once the edit count exceeds this fraction of the tree size.
+    rebuild_ratio = 0.5
+
+    # The query cache, if enable_cache() was called, and the number of
+    # changes made to the tree, which tells its stale entries apart.
+    _cache = None
+    _generation = 0
+
+    # (generation, FrozenIntervalTree) from the last freeze(); see there.
+    _frozen = None
+
+    def apply(self, adds=(), removes=()):
         """
-        for iv in intervals:
-            self.add(iv)
+        Removes the intervals in removes that are present, then adds
+        the intervals in adds that are not.
+
+        Small edits are applied one interval at a time. When there are
+        more than rebuild_ratio times as many edits as intervals in the
+        tree, the tree is instead rebuilt once from the resulting set,
+        as in the constructor.
+
+        Raises ValueError, leaving the tree unchanged, if adds holds a
+        null Interval.
+
+        Completes in O(k*log(n+k)) time, where k = len(adds) +
+        len(removes), or in O((n+k)*log(n+k)) time if rebuilt.
+        """
+        adds = adds if isinstance(adds, (set, frozenset)) else set(adds)
+        removes = removes if isinstance(removes, (set, frozenset)) else set(removes)
+        for iv in adds:
+            if iv.is_null():
+                raise ValueError(
+                    "IntervalTree: Null Interval objects not allowed in IntervalTree:"
+                    " {0}".format(iv)
+                )
+        if len(adds) + len(removes) > self.rebuild_ratio * len(self):
+            intervals = (self.all_intervals - removes) | adds
+            self._build(intervals, sorted(intervals, key=range_key))
+        else:
+            for iv in removes:
+                self.discard(iv)
+            for iv in adds:
+                self.add(iv)
+
+    @contextmanager
+    def batch(self):
+        """
+        Context manager collecting edits to apply in one go on exit::
+
+            with tree.batch() as edits:
+                edits.add(Interval(0, 10))
+                edits.discard(Interval(5, 15))
+
+        The tree is unchanged, and can be queried as before, until the
+        block exits; then the net edits are passed to apply(). If the
+        block raises, the edits are dropped.
+        """
+        edits = _Batch()
+        yield edits
+        self.apply(adds=edits.adds, removes=edits.removes)
 
     def extend(self, intervals):
         """
@@ -364,8 +605,9 @@ class IntervalTree(collections.MutableSet):
             #print(self.all_intervals)
             raise ValueError
         self.top_node = self.top_node.remove(interval)
-        self.all_intervals.remove(interval)
+        self._count -= 1
         self._remove_boundaries(interval)
+        self._mutated()
         #self.verify()
     
     def removei(self, begin, end, data=None):
@@ -385,9 +627,10 @@ class IntervalTree(collections.MutableSet):
         """
         if interval not in self:
             return
-        self.all_intervals.discard(interval)
         self.top_node = self.top_node.discard(interval)
+        self._count -= 1
         self._remove_boundaries(interval)
+        self._mutated()
     
     def discardi(self, begin, end, data=None):
         """
@@ -406,21 +649,20 @@ class IntervalTree(collections.MutableSet):
         for iv in self:
             if iv not in other:
                 ivs.add(iv)
-        return IntervalTree(ivs)
+        return IntervalTree(ivs, engine=self.engine)
 
     def difference_update(self, other):
         """
         Removes all intervals in other from self.
         """
-        for iv in other:
-            self.discard(iv)
+        self.apply(removes=other)
 
     def union(self, other):
         """
         Returns a new tree, comprising all intervals from self
         and other.
         """
-        return IntervalTree(set(self).union(other))
+        return IntervalTree(set(self).union(other), engine=self.engine)
 
     def intersection(self, other):
         """
@@ -432,15 +674,13 @@ class IntervalTree(collections.MutableSet):
         for iv in shorter:
             if iv in longer:
                 ivs.add(iv)
-        return IntervalTree(ivs)
+        return IntervalTree(ivs, engine=self.engine)
 
     def intersection_update(self, other):
         """
         Removes intervals from self unless they also exist in other.
         """
-        for iv in self:
-            if iv not in other:
-                self.remove(iv)
+        self.apply(removes=[iv for iv in self if iv not in other])
 
     def symmetric_difference(self, other):
         """
@@ -450,7 +690,7 @@ class IntervalTree(collections.MutableSet):
         if not isinstance(other, set): other = set(other)
         me = set(self)
         ivs = me - other + (other - me)
-        return IntervalTree(ivs)
+        return IntervalTree(ivs, engine=self.engine)
 
     def symmetric_difference_update(self, other):
         """
@@ -458,11 +698,8 @@ class IntervalTree(collections.MutableSet):
         not both.
         """
         other = set(other)
-        for iv in self:
-            if iv in other:
-                self.remove(iv)
-                other.remove(iv)
-        self.update(other)
+        common = self.all_intervals & other
+        self.apply(adds=other - common, removes=common)
 
     def remove_overlap(self, begin, end=None):
         """
@@ -474,21 +711,17 @@ class IntervalTree(collections.MutableSet):
           * r = size of the search range (this is 1 for a point)
         """
         hitlist = self.search(begin, end)
-        for iv in hitlist: 
-            self.remove(iv)
+        self.apply(removes=hitlist)
 
     def remove_envelop(self, begin, end):
         """
         Removes all intervals completely enveloped in the given range.
         
-        Completes in O((r+m)*log n) time, where:
+        Completes in O(m*log n) time, where:
           * n = size of the tree
           * m = number of matches
-          * r = size of the search range (this is 1 for a point)
         """
-        hitlist = self.search(begin, end, strict=True)
-        for iv in hitlist:
-            self.remove(iv)
+        self.apply(removes=set(self.iter_envelop(begin, end)))
 
     def chop(self, begin, end, datafunc=None):
         """
@@ -510,10 +743,10 @@ class IntervalTree(collections.MutableSet):
             for iv in end_hits:
                 insertions.add(Interval(end, iv.end, iv.data))
 
-        self.remove_envelop(begin, end)
-        self.difference_update(begin_hits)
-        self.difference_update(end_hits)
-        self.update(insertions)
+        removals = set(self.iter_envelop(begin, end))
+        removals.update(begin_hits)
+        removals.update(end_hits)
+        self.apply(adds=insertions, removes=removals)
 
     def slice(self, point, datafunc=None):
         """
@@ -534,8 +767,7 @@ class IntervalTree(collections.MutableSet):
             for iv in hitlist:
                 insertions.add(Interval(iv.begin, point, iv.data))
                 insertions.add(Interval(point, iv.end, iv.data))
-        self.difference_update(hitlist)
-        self.update(insertions)
+        self.apply(adds=insertions, removes=hitlist)
 
     def clear(self):
         """
@@ -543,28 +775,47 @@ class IntervalTree(collections.MutableSet):
 
         Completes in O(1) tine.
         """
-        self.__init__()
+        self.__init__(engine=self.engine)
 
-    def find_nested(self):
+    def find_nested(self, immediate=False):
         """
         Returns a dictionary mapping parent intervals to sets of 
-        intervals overlapped by and contained in the parent.
-        
-        Completes in O(n^2) time.
+        intervals overlapped by and contained in the parent. Of two
+        intervals with the same range, only one is the parent of the
+        other.
+
+        If immediate is True, a child is only listed under those of its
+        parents that contain none of its other parents.
+
+        The intervals are swept in order of begin, longest first, while
+        the ones not yet passed are kept sorted by end; the parents of
+        each interval are then the kept ones ending at or after it.
+
+        Completes in O(n*log n + m) time, where m is the number of
+        nested pairs (counting indirect ones, even if immediate is set).
         :rtype: dict of [Interval, set of Interval]
         """
         result = {}
-        
-        def add_if_nested():
-            if parent.contains_interval(child):
+        ivs = sorted(self.all_intervals, key=attrgetter('end'), reverse=True)
+        ivs.sort(key=attrgetter('begin'))  # stable, so ends stay descending
+
+        open_ivs = SortedDict()  # (end, -position) -> interval
+        for position, child in enumerate(ivs):
+            while open_ivs and open_ivs.key_at(0)[0] <= child.begin:
+                del open_ivs[open_ivs.key_at(0)]
+            latest = -1  # greatest position of a parent seen so far
+            for key in open_ivs.irange((child.end,)):
+                if immediate:
+                    # a parent contains every parent after it that
+                    # does not end later
+                    if -key[1] < latest:
+                        continue
+                    latest = -key[1]
+                parent = open_ivs[key]
                 if parent not in result:
                     result[parent] = set()
                 result[parent].add(child)
-                
-        long_ivs = sorted(self.all_intervals, key=Interval.length, reverse=True)
-        for i, parent in enumerate(long_ivs):
-            for child in long_ivs[i + 1:]:
-                add_if_nested()
+            open_ivs[(child.end, -position)] = child
         return result
     
     def overlaps(self, begin, end=None):
@@ -600,44 +851,142 @@ class IntervalTree(collections.MutableSet):
         range. Returns False if given a null interval over which to
         test.
         
-        Completes in O(r*log n) time, where r is the range length and n
-        is the table size.
+        Completes in O(r*log n) time, where r is the number of
+        boundaries inside the range and n is the table size.
         :rtype: bool
         """
         if self.is_empty():
             return False
         elif begin >= end:
             return False
+        elif self.engine == 'augmented':
+            return self.top_node.overlaps_range(begin, end)
         elif self.overlaps_point(begin):
             return True
         return any(
             self.overlaps_point(bound) 
-            for bound in self.boundary_table 
-            if begin < bound < end
+            for bound in self.boundary_table.irange(
+                begin, end, inclusive=(False, False))
         )
     
+    def iter_split_overlaps(self):
+        """
+        Yields the intervals split_overlaps() would leave in the tree,
+        without changing the tree: for each pair of consecutive
+        boundaries lbound, ubound, one Interval(lbound, ubound, data)
+        per distinct data field among the intervals containing lbound.
+        Pieces are yielded in ascending order of begin.
+
+        The boundaries are swept once, keeping only the intervals that
+        contain the current boundary in memory, so the pieces can be
+        streamed elsewhere without building a second tree. The tree
+        must not be modified while iterating.
+
+        Completes in O(n*log n + m) time, where m is the number of
+        pieces yielded.
+        :rtype: collections.Iterator[Interval]
+        """
+        starts = self.sorted_intervals()
+        n = len(starts)
+        i = 0
+        active = set()
+        ends = []  # heap of (end, tie breaker, interval) over active
+        tie = count()
+        lbound = None
+        for ubound in self.boundary_table:
+            if active:
+                for piece in set(
+                        Interval(lbound, ubound, iv.data) for iv in active):
+                    yield piece
+            while ends and ends[0][0] <= ubound:
+                active.remove(heappop(ends)[2])
+            while i < n and starts[i].begin <= ubound:
+                iv = starts[i]
+                active.add(iv)
+                heappush(ends, (iv.end, next(tie), iv))
+                i += 1
+            lbound = ubound
+
     def split_overlaps(self):
         """
         Finds all intervals with overlapping ranges and splits them
         along the range boundaries.
-        
-        Completes in worst-case O(n^2*log n) time (many interval 
-        boundaries are inside many intervals), best-case O(n*log n)
-        time (small number of overlaps << n per interval).
+
+        Completes in O(n*log n + m) time, where m is the number of
+        intervals after splitting.
         """
         if not self:
             return
         if len(self.boundary_table) == 2:
             return
 
-        bounds = sorted(self.boundary_table)  # get bound locations
+        new_ivs = list(self.iter_split_overlaps())
+        self._build(set(new_ivs), new_ivs)
+
+    def iter_merged(self, data_reducer=None, data_initializer=None):
+        """
+        Yields the intervals merge_overlaps() would leave in the tree,
+        in ascending order, without changing the tree. data_reducer and
+        data_initializer work as in merge_overlaps().
+
+        The intervals are read from the cached sorted_intervals(), so
+        besides that, only the interval being merged into and the run
+        of intervals sharing the current range are held in memory. The
+        tree must not be modified while iterating.
+
+        Completes in O(n*logn).
+        :rtype: collections.Iterator[Interval]
+        """
+        return self._iter_merged(
+            lambda lower, higher: higher.begin <= lower.end,
+            data_reducer, data_initializer)
 
-        new_ivs = set()
-        for lbound, ubound in zip(bounds[:-1], bounds[1:]):
-            for iv in self[lbound]:
-                new_ivs.add(Interval(lbound, ubound, iv.data))
+    def iter_merged_equals(self, data_reducer=None, data_initializer=None):
+        """
+        Yields the intervals merge_equals() would leave in the tree,
+        in ascending order, without changing the tree. data_reducer and
+        data_initializer work as in merge_overlaps().
 
-        self.__init__(new_ivs)
+        Completes in O(n*logn).
+        :rtype: collections.Iterator[Interval]
+        """
+        return self._iter_merged(
+            lambda lower, higher: higher.range_matches(lower),
+            data_reducer, data_initializer)
+
+    def _iter_merged(self, should_merge, data_reducer, data_initializer):
+        """
+        Sweeps the intervals in sorted order, merging each into the
+        current series while should_merge(lower, higher) holds, and
+        yields each series once it is finished.
+        """
+        lower = None
+        current_reduced = None
+        for _, run in groupby(self.sorted_intervals(), key=range_key):
+            run = list(run)
+            if len(run) > 1:
+                run.sort()  # order ties by data, as sorted() would
+            for higher in run:
+                if lower is not None and should_merge(lower, higher):
+                    upper_bound = max(lower.end, higher.end)
+                    if data_reducer is not None:
+                        current_reduced = data_reducer(current_reduced, higher.data)
+                    else:  # annihilate the data, since we don't know how to merge it
+                        current_reduced = None
+                    lower = Interval(lower.begin, upper_bound, current_reduced)
+                    continue
+                # higher begins a new series
+                if lower is not None:
+                    yield lower
+                if data_initializer is None:
+                    current_reduced = higher.data
+                    lower = higher
+                else:
+                    current_reduced = copy(data_initializer)
+                    current_reduced = data_reducer(current_reduced, higher.data)
+                    lower = Interval(higher.begin, higher.end, current_reduced)
+        if lower is not None:
+            yield lower
 
     def merge_overlaps(self, data_reducer=None, data_initializer=None):
         """
@@ -666,38 +1015,8 @@ class IntervalTree(collections.MutableSet):
         if not self:
             return
 
-        sorted_intervals = sorted(self.all_intervals)  # get sorted intervals
-        merged = []
-        # use mutable object to allow new_series() to modify it
-        current_reduced = [None]
-        higher = None  # iterating variable, which new_series() needs access to
-
-        def new_series():
-            if data_initializer is None:
-                current_reduced[0] = higher.data
-                merged.append(higher)
-                return
-            else:  # data_initializer is not None
-                current_reduced[0] = copy(data_initializer)
-                current_reduced[0] = data_reducer(current_reduced[0], higher.data)
-                merged.append(Interval(higher.begin, higher.end, current_reduced[0]))
-
-        for higher in sorted_intervals:
-            if merged:  # series already begun
-                lower = merged[-1]
-                if higher.begin <= lower.end:  # should merge
-                    upper_bound = max(lower.end, higher.end)
-                    if data_reducer is not None:
-                        current_reduced[0] = data_reducer(current_reduced[0], higher.data)
-                    else:  # annihilate the data, since we don't know how to merge it
-                        current_reduced[0] = None
-                    merged[-1] = Interval(lower.begin, upper_bound, current_reduced[0])
-                else:
-                    new_series()
-            else:  # not merged; is first of Intervals to merge
-                new_series()
-
-        self.__init__(merged)
+        merged = list(self.iter_merged(data_reducer, data_initializer))
+        self._build(set(merged), merged)
 
     def merge_equals(self, data_reducer=None, data_initializer=None):
         """
@@ -726,38 +1045,8 @@ class IntervalTree(collections.MutableSet):
         if not self:
             return
 
-        sorted_intervals = sorted(self.all_intervals)  # get sorted intervals
-        merged = []
-        # use mutable object to allow new_series() to modify it
-        current_reduced = [None]
-        higher = None  # iterating variable, which new_series() needs access to
-
-        def new_series():
-            if data_initializer is None:
-                current_reduced[0] = higher.data
-                merged.append(higher)
-                return
-            else:  # data_initializer is not None
-                current_reduced[0] = copy(data_initializer)
-                current_reduced[0] = data_reducer(current_reduced[0], higher.data)
-                merged.append(Interval(higher.begin, higher.end, current_reduced[0]))
-
-        for higher in sorted_intervals:
-            if merged:  # series already begun
-                lower = merged[-1]
-                if higher.range_matches(lower):  # should merge
-                    upper_bound = max(lower.end, higher.end)
-                    if data_reducer is not None:
-                        current_reduced[0] = data_reducer(current_reduced[0], higher.data)
-                    else:  # annihilate the data, since we don't know how to merge it
-                        current_reduced[0] = None
-                    merged[-1] = Interval(lower.begin, upper_bound, current_reduced[0])
-                else:
-                    new_series()
-            else:  # not merged; is first of Intervals to merge
-                new_series()
-
-        self.__init__(merged)
+        merged = list(self.iter_merged_equals(data_reducer, data_initializer))
+        self._build(set(merged), merged)
 
     def items(self):
         """
@@ -787,6 +1076,20 @@ class IntervalTree(collections.MutableSet):
           * n = size of the tree
           * m = number of matches
           * k = size of the search range (this is 1 for a point)
+        With engine='augmented', or with strict=True, completes in
+        O(m + log n) time; see iter_envelop().
+
+        If enable_cache() was called, returns a frozenset, and repeated
+        queries on an unchanged tree complete in O(1) time.
+        :rtype: set of Interval
+        """
+        if self._cache is not None:
+            return self._cached_search(begin, end, strict)
+        return self._search(begin, end, strict)
+
+    def _search(self, begin, end, strict):
+        """
+        search(), without the query cache.
         :rtype: set of Interval
         """
         root = self.top_node
@@ -795,11 +1098,15 @@ class IntervalTree(collections.MutableSet):
         if end is None:
             try:
                 iv = begin
-                return self.search(iv.begin, iv.end, strict=strict)
+                return self._search(iv.begin, iv.end, strict)
             except:
                 return root.search_point(begin, set())
         elif begin >= end:
             return set()
+        elif strict:
+            return set(root.search_contained(begin, end))
+        elif self.engine == 'augmented':
+            result = set(root.search_range(begin, end, []))
         else:
             result = root.search_point(begin, set())
 
@@ -807,23 +1114,423 @@ class IntervalTree(collections.MutableSet):
             bound_begin = boundary_table.bisect_left(begin)
             bound_end = boundary_table.bisect_left(end)  # exclude final end bound
             result.update(root.search_overlap(
-                # slice notation is slightly slower
-                boundary_table.iloc[index] for index in xrange(bound_begin, bound_end)
+                boundary_table.islice(bound_begin, bound_end)
             ))
+        return result
 
-            # TODO: improve strict search to use node info instead of less-efficient filtering
-            if strict:
-                result = set(
-                    iv for iv in result
-                    if iv.begin >= begin and iv.end <= end
-                )
-            return result
+    def _cached_search(self, begin, end, strict):
+        """
+        search() through the query cache.
+        :rtype: frozenset of Interval
+        """
+        if end is None:
+            try:
+                begin, end = begin.begin, begin.end
+            except AttributeError:
+                strict = False  # has no effect on point queries
+        key = (begin, end, strict)
+        result = self._cache.get(key, self._generation)
+        if result is None:
+            result = frozenset(self._search(begin, end, strict))
+            self._cache.put(key, self._generation, result)
+        return result
+
+    def enable_cache(self, maxsize=1024):
+        """
+        Turns on a cache of the results of the last maxsize distinct
+        search() queries, keyed by (begin, end, strict), including the
+        queries made through tree[...]. While it is on, search()
+        returns frozensets, which callers cannot corrupt.
+
+        Each change to the tree bumps a generation counter, and results
+        cached under an older generation are never returned, so the
+        cache need not be cleared by hand. Calling this again starts
+        an empty cache. The cache is not safe to use from several
+        threads at once.
+        """
+        self._cache = _QueryCache(maxsize)
+
+    def disable_cache(self):
+        """
+        Turns off, and drops, the query cache.
+        """
+        self._cache = None
+
+    def cache_info(self):
+        """
+        Returns (hits, misses, maxsize, currsize) for the query cache,
+        as in functools.lru_cache, or None if the cache is off.
+        :rtype: CacheInfo
+        """
+        if self._cache is None:
+            return None
+        return self._cache.info()
+
+    def iter_envelop(self, begin, end):
+        """
+        Yields, lazily, all intervals fully contained in the range
+        [begin, end]. The tree must not change while the iterator is
+        in use.
+
+        The traversal prunes by both bounds, so only contained
+        intervals are visited, not everything overlapping the range.
+
+        Completes in O(m + log n) time, where m is the number of
+        matches, for engine='centered'. For engine='augmented', m also
+        counts intervals beginning in the range that end past it.
+        :rtype: collections.Iterator[Interval]
+        """
+        if self.top_node and begin < end:
+            for iv in self.top_node.search_contained(begin, end):
+                yield iv
     
+    def stab(self, point, out=None):
+        """
+        Returns a list of all intervals containing point. If out is
+        given, the intervals are appended to it instead, and out is
+        returned; no set is built.
+
+        Completes in O(m + log n) time, where:
+          * n = size of the tree
+          * m = number of matches
+        :rtype: list of Interval
+        """
+        if out is None:
+            out = []
+        if self.top_node:
+            self.top_node.stab_point(point, out)
+        return out
+
+    def sorted_intervals(self):
+        """
+        Returns a tuple of all intervals in the tree, sorted by begin,
+        then end. The tuple is cached until the tree next changes.
+
+        Completes in O(1) time if cached, O(n*log n) time otherwise.
+        :rtype: tuple of Interval
+        """
+        if self._sorted is None:
+            # Safe on a tree other threads are reading: the tuple is
+            # built in full before the one assignment that caches it.
+            self._sorted = tuple(
+                sorted(self.all_intervals, key=range_key))
+        return self._sorted
+
+    def endpoint_arrays(self):
+        """
+        Returns (begins, ends), NumPy arrays of the endpoints of
+        sorted_intervals(). Cached until the tree next changes.
+
+        Requires NumPy.
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        if self._endpoint_arrays is None:
+            import numpy as np
+            ivs = self.sorted_intervals()
+            # Both arrays are built before the pair is cached, as in
+            # sorted_intervals().
+            self._endpoint_arrays = (
+                np.array([iv.begin for iv in ivs]),
+                np.array([iv.end for iv in ivs]),
+            )
+        return self._endpoint_arrays
+
+    def search_points(self, points):
+        """
+        Point queries for a whole array of points at once. Returns
+        (offsets, indices) in compressed sparse row form: the
+        intervals containing points[i] are
+
+            [tree.sorted_intervals()[j] for j in indices[offsets[i]:offsets[i + 1]]]
+
+        in ascending (begin, end) order.
+
+        Each interval covers a contiguous run of the sorted points,
+        found with two searchsorted() calls, so no tree traversal or
+        per-point set is needed.
+
+        Completes in O((n + q)*log q + m) time, where:
+          * n = size of the tree
+          * q = number of points
+          * m = number of matches
+        Requires NumPy.
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        import numpy as np
+        points = np.asarray(points).ravel()
+        begins, ends = self.endpoint_arrays()
+
+        order = np.argsort(points, kind='mergesort')
+        sorted_points = points[order]
+        lo = np.searchsorted(sorted_points, begins, 'left')
+        hi = np.searchsorted(sorted_points, ends, 'left')
+        # Expand each interval's run [lo, hi) of sorted points into
+        # (point, interval) pairs.
+        iv_index, run_index = _expand_runs(lo, hi)
+        point_index = order[run_index]
+
+        # Group by point; the stable sort keeps intervals in order.
+        by_point = np.argsort(point_index, kind='mergesort')
+        indices = iv_index[by_point]
+        offsets = np.zeros(len(points) + 1, dtype=np.intp)
+        np.cumsum(np.bincount(point_index, minlength=len(points)),
+                  out=offsets[1:])
+        return offsets, indices
+
+    def _depth_sweep(self):
+        """
+        Returns (bounds, depths), lists of the boundaries in ascending
+        order and the number of intervals covering [bounds[i],
+        bounds[i + 1]), found by adding up the begins and ends met at
+        each boundary. The boundary table counts both, so the ends at a
+        boundary are its count less the begins there, and need no sort.
+
+        Completes in O(n) time if sorted_intervals() is cached, O(n*log
+        n) time otherwise.
+        :rtype: (list, list of int)
+        """
+        bounds = self.boundary_table.keys()
+        counts = self.boundary_table.values()
+        begins = [iv.begin for iv in self.sorted_intervals()]
+        depths = []
+        depth = i = 0
+        for bound, count in zip(bounds, counts):
+            starts = 0
+            while i < len(begins) and begins[i] == bound:
+                starts += 1
+                i += 1
+            depth += starts - (count - starts)
+            depths.append(depth)
+        return bounds, depths
+
+    def depth_profile(self):
+        """
+        Returns (breakpoints, depths), NumPy arrays where breakpoints
+        holds every interval boundary in ascending order and depths[i]
+        is the number of intervals covering [breakpoints[i],
+        breakpoints[i + 1]). The last depth is always 0.
+
+            >>> tree = IntervalTree.from_tuples([(0, 4), (2, 6), (3, 5)])
+            >>> breakpoints, depths = tree.depth_profile()
+            >>> breakpoints.tolist(), depths.tolist()
+            ([0, 2, 3, 4, 5, 6], [1, 2, 3, 2, 1, 0])
+
+        Completes in O(n*log n) time.
+        Requires NumPy.
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        import numpy as np
+        bounds, depths = self._depth_sweep()
+        return np.array(bounds), np.array(depths, dtype=np.intp)
+
+    def max_depth(self, begin, end):
+        """
+        Returns the greatest number of intervals covering any one point
+        of [begin, end), or 0 for a null range.
+
+            >>> tree = IntervalTree.from_tuples([(0, 4), (2, 6), (3, 5)])
+            >>> tree.max_depth(0, 3), tree.max_depth(0, 10), tree.max_depth(5, 6)
+            (2, 3, 1)
+
+        The depths are kept in a segment tree over the boundaries,
+        built on the first call. It is updated in place as intervals
+        are removed, or added between existing boundaries; adding an
+        interval with a new boundary drops it, to be rebuilt on the
+        next call.
+
+        Completes in O(log n) time, plus O(n*log n) time to rebuild.
+        :rtype: int
+        """
+        depth_tree = self._depth_tree
+        if depth_tree is None:
+            # Cached only once built; max_depth() does not change it.
+            depth_tree = self._depth_tree = DepthTree(*self._depth_sweep())
+        return depth_tree.max_depth(begin, end)
+
+    def nearest(self, target, k=1):
+        """
+        Returns a list of the k intervals nearest to target, a point or
+        an Interval, nearest first, by the distance of
+        Interval.distance_to(); intervals touching or overlapping
+        target are at distance 0. Returns fewer if the tree holds fewer
+        than k intervals.
+
+            >>> tree = IntervalTree.from_tuples([(0, 2), (5, 7), (10, 15)])
+            >>> tree.nearest(3)
+            [Interval(0, 2)]
+            >>> tree.nearest(Interval(8, 9.5), k=2)
+            [Interval(10, 15), Interval(5, 7)]
+
+        The tree is searched best-first, so only the nodes that could
+        hold one of the k nearest intervals are visited.
+
+        Completes in O((log n + k)*log(log n + k)) time for typical
+        trees.
+        :rtype: list of Interval
+        """
+        if k < 1 or not self.top_node:
+            return []
+        if isinstance(target, Number):
+            begin = end = target
+        else:
+            begin, end = target.begin, target.end
+        return [iv for _, iv in self.top_node.nearest(begin, end, k)]
+
+    def overlap_join(self, other, as_arrays=False):
+        """
+        Returns all pairs (a, b) of an interval a in this tree and an
+        interval b in the IntervalTree other that overlap, as an
+        iterator. Pairs come in ascending order of the later begin of
+        the two intervals.
+
+        If as_arrays is True, returns (self_indices, other_indices)
+        instead: parallel NumPy arrays with one entry per pair, indexing
+        into self.sorted_intervals() and other.sorted_intervals().
+        Requires NumPy.
+
+        Completes in O((n + m)*log(n + m) + k) time, where:
+          * n, m = sizes of the two trees
+          * k = number of pairs
+        :rtype: collections.Iterator[(Interval, Interval)] or
+                (numpy.ndarray, numpy.ndarray)
+        """
+        if as_arrays:
+            return self._overlap_join_arrays(other)
+        return self._iter_overlap_join(other)
+
+    def _iter_overlap_join(self, other):
+        """
+        Sweeps the begins of both trees at once. Each side keeps the
+        intervals it has begun that may still overlap a later begin,
+        and every interval is paired with the other side's kept
+        intervals when its begin is reached.
+        """
+        active = ({}, {})  # per side: position -> interval
+        ends = ([], [])    # per side: heap of (end, position) over active
+        sweep = merge(
+            ((iv.begin, 0, i, iv) for i, iv in enumerate(self.sorted_intervals())),
+            ((iv.begin, 1, i, iv) for i, iv in enumerate(other.sorted_intervals()))
+        )
+        for begin, side, position, iv in sweep:
+            matches, match_ends = active[1 - side], ends[1 - side]
+            while match_ends and match_ends[0][0] <= begin:
+                del matches[heappop(match_ends)[1]]
+            if side == 0:
+                for match in matches.values():
+                    yield iv, match
+            else:
+                for match in matches.values():
+                    yield match, iv
+            active[side][position] = iv
+            heappush(ends[side], (iv.end, position))
+
+    def _overlap_join_arrays(self, other):
+        """
+        overlap_join() for as_arrays=True. The pairs where b begins in
+        [a.begin, a.end) form a run of other's sorted begins for each
+        a, and the pairs where a begins in (b.begin, b.end) a run of
+        this tree's sorted begins for each b; both are found with
+        searchsorted().
+        """
+        import numpy as np
+        a_begins, a_ends = self.endpoint_arrays()
+        b_begins, b_ends = other.endpoint_arrays()
+        a_first, b_later = _expand_runs(
+            np.searchsorted(b_begins, a_begins, 'left'),
+            np.searchsorted(b_begins, a_ends, 'left'))
+        b_first, a_later = _expand_runs(
+            np.searchsorted(a_begins, b_begins, 'right'),
+            np.searchsorted(a_begins, b_ends, 'left'))
+        return (np.concatenate((a_first, a_later)),
+                np.concatenate((b_later, b_first)))
+
+    def freeze(self):
+        """
+        Returns a FrozenIntervalTree with the same intervals: an
+        immutable, array-backed copy for trees that will only be
+        queried from now on. The copy is kept until the tree next
+        changes, and returned again by later calls.
+
+        Completes in O(1) time if cached, O(n) time if
+        endpoint_arrays() is cached.
+        Requires NumPy.
+        :rtype: FrozenIntervalTree
+        """
+        frozen = self._frozen
+        if frozen is not None and frozen[0] == self._generation:
+            return frozen[1]
+        from frozenintervaltree import FrozenIntervalTree
+        generation = self._generation
+        begins, ends = self.endpoint_arrays()
+        frozen = FrozenIntervalTree.from_sorted_arrays(
+            begins, ends, [iv.data for iv in self.sorted_intervals()])
+        self._frozen = (generation, frozen)
+        return frozen
+
+    def parallel_search(self, queries, workers=None, strict=False,
+                        as_indices=False):
+        """
+        Runs search() for every query in queries, each a point or a
+        (begin, end) pair, across a pool of worker processes that share
+        one frozen copy of the tree; see
+        FrozenIntervalTree.parallel_search(). The frozen copy, and its
+        shared memory, are reused until the tree changes. If as_indices
+        is True, returns arrays of positions in sorted_intervals()
+        instead of sets of Intervals.
+
+        Worthwhile for large batches of queries; for a few, search()
+        is faster.
+        Requires NumPy and Python 3.8 or later.
+        :rtype: list of set of Interval, or list of numpy.ndarray
+        """
+        return self.freeze().parallel_search(
+            queries, workers=workers, strict=strict, as_indices=as_indices)
+
+    def save(self, path):
+        """
+        Writes the tree to the file at path in the binary format of
+        FrozenIntervalTree.save(). Raises ValueError, before writing
+        anything, if the interval bounds are not numeric.
+
+            >>> IntervalTree([Interval('a', 'c')]).save('never-written.ivt')
+            Traceback (most recent call last):
+              ...
+            ValueError: IntervalTree: cannot save non-numeric begins
+
+        Completes in O(n) time if endpoint_arrays() is cached.
+        Requires NumPy.
+        """
+        for name, array in zip(('begins', 'ends'), self.endpoint_arrays()):
+            if array.dtype.kind not in 'iuf':
+                raise ValueError(
+                    "IntervalTree: cannot save non-numeric {0}".format(name))
+        self.freeze().save(path)
+
+    @classmethod
+    def load(cls, path, mmap=True, engine='centered'):
+        """
+        Reads a tree written by save(), or by FrozenIntervalTree.save().
+        The intervals are stored sorted, so the tree is built without
+        sorting them first, as in from_sorted_arrays(). If mmap is
+        True, the file is mapped into memory rather than read.
+
+        To query a stored tree without building one at all, use
+        FrozenIntervalTree.load() instead.
+
+        Completes in O(n*log n) time, to build the nodes.
+        Requires NumPy.
+        :rtype: IntervalTree
+        """
+        from frozenintervaltree import FrozenIntervalTree
+        frozen = FrozenIntervalTree.load(path, mmap=mmap)
+        return cls.from_sorted_arrays(
+            frozen.begins, frozen.ends, frozen.data, engine=engine)
+
     def begin(self):
         """
         Returns the lower bound of the first interval in the tree.
         
-        Completes in O(n) time.
+        Completes in O(log n) time.
         """
         if not self.boundary_table:
             return 0
@@ -833,7 +1540,7 @@ class IntervalTree(collections.MutableSet):
         """
         Returns the upper bound of the last interval in the tree.
         
-        Completes in O(n) time.
+        Completes in O(log n) time.
         """
         if not self.boundary_table:
             return 0
@@ -1028,21 +1735,20 @@ class IntervalTree(collections.MutableSet):
         This method only returns True for exact matches; for
         overlaps, see the overlaps() method.
         
-        Completes in O(1) time.
+        Completes in O(log n) time.
         :rtype: bool
         """
         # Removed point-checking code; it might trick the user into
         # thinking that this is O(1), which point-checking isn't.
-        #if isinstance(item, Interval):
-        return item in self.all_intervals
-        #else:
-        #    return self.contains_point(item)
+        if not isinstance(item, Interval) or not self.top_node:
+            return False
+        return self.top_node.has_interval(item)
     
     def containsi(self, begin, end, data=None):
         """
         Shortcut for (Interval(begin, end, data) in tree).
         
-        Completes in O(1) time.
+        Completes in O(log n) time.
         :rtype: bool
         """
         return Interval(begin, end, data) in self
@@ -1054,7 +1760,9 @@ class IntervalTree(collections.MutableSet):
         Completes in O(1) time.
         :rtype: collections.Iterable[Interval]
         """
-        return self.all_intervals.__iter__()
+        if not self.top_node:
+            return iter(())
+        return self.top_node.iter_children()
     iter = __iter__
     
     def __len__(self):
@@ -1064,13 +1772,14 @@ class IntervalTree(collections.MutableSet):
         Completes in O(1) time.
         :rtype: int
         """
-        return len(self.all_intervals)
+        return self._count
     
     def __eq__(self, other):
         """
         Whether two IntervalTrees are equal.
         
-        Completes in O(n) time if sizes are equal; O(1) time otherwise.
+        Completes in O(n*log n) time if sizes are equal; O(1) time
+        otherwise.
         :rtype: bool
         """
         return (
@@ -1095,5 +1804,150 @@ class IntervalTree(collections.MutableSet):
         For pickle-ing.
         :rtype: tuple
         """
-        return IntervalTree, (sorted(self.all_intervals),)
+        return IntervalTree, (sorted(self.all_intervals), self.engine)
+
+
+def _expand_runs(lo, hi):
+    """
+    Given NumPy arrays lo and hi with lo <= hi, returns (rows, cols),
+    parallel arrays listing every (i, j) with lo[i] <= j < hi[i],
+    ordered by i, then j.
+    """
+    import numpy as np
+    counts = hi - lo
+    rows = np.repeat(np.arange(len(lo)), counts)
+    run_start = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+    cols = np.arange(len(rows)) + run_start
+    return rows, cols
+
+
+class _Batch(object):
+    """
+    The net edits collected by IntervalTree.batch().
+    """
+    def __init__(self):
+        self.adds = set()
+        self.removes = set()
+
+    def add(self, interval):
+        """
+        Adds interval when the batch is applied.
+        """
+        self.removes.discard(interval)
+        self.adds.add(interval)
+
+    def addi(self, begin, end, data=None):
+        """
+        Shortcut for add(Interval(begin, end, data)).
+        """
+        return self.add(Interval(begin, end, data))
+
+    def discard(self, interval):
+        """
+        Removes interval, if present, when the batch is applied.
+        """
+        self.adds.discard(interval)
+        self.removes.add(interval)
+    remove = discard
+
+    def discardi(self, begin, end, data=None):
+        """
+        Shortcut for discard(Interval(begin, end, data)).
+        """
+        return self.discard(Interval(begin, end, data))
+    removei = discardi
+
+    def update(self, intervals):
+        for iv in intervals:
+            self.add(iv)
+
+    def difference_update(self, intervals):
+        for iv in intervals:
+            self.discard(iv)
+
+    def __len__(self):
+        return len(self.adds) + len(self.removes)
+
+
+class _IntervalSet(collections.Set):
+    """
+    The read-only set view returned by IntervalTree.all_intervals.
+    """
+    __slots__ = ('_tree',)
+
+    def __init__(self, tree):
+        self._tree = tree
+
+    @classmethod
+    def _from_iterable(cls, intervals):
+        return set(intervals)
+
+    def __contains__(self, item):
+        return item in self._tree
+
+    def __iter__(self):
+        return iter(self._tree)
+
+    def __len__(self):
+        return len(self._tree)
+
+
+def _interval_array(intervals):
+    """
+    Returns intervals if it is an IntervalArray, else None. An
+    IntervalArray can only exist once its module, and so NumPy, has
+    been imported, so other iterables never trigger that import.
+    :rtype: IntervalArray or None
+    """
+    module = sys.modules.get('intervalarray')
+    if module is not None and isinstance(intervals, module.IntervalArray):
+        return intervals
+    return None
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class _QueryCache(object):
+    """
+    The least-recently-used cache of IntervalTree.enable_cache(). Each
+    result is stored with the tree generation it was computed in.
+
+    Threads querying the same tree share its cache, so an entry may be
+    evicted between a lookup and the reordering that follows it. Such
+    races only cost a hit or a miss count, never an exception.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()  # key -> (generation, result)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, generation):
+        """
+        Returns the result cached for key in this generation, or None.
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] == generation:
+                try:
+                    self.entries.move_to_end(key)
+                except KeyError:  # evicted by another thread
+                    pass
+                self.hits += 1
+                return entry[1]
+            self.entries.pop(key, None)  # stale
+        self.misses += 1
+        return None
+
+    def put(self, key, generation, result):
+        self.entries[key] = (generation, result)
+        while len(self.entries) > self.maxsize:
+            try:
+                self.entries.popitem(last=False)
+            except KeyError:
+                break
 
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize,
+                         len(self.entries))
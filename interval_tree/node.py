@@ -19,10 +19,41 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+from interval import range_key
+from heapq import heappop, heappush
+from itertools import count
 from operator import attrgetter
 from math import floor, log
 
 
+# Bounds still to be tested in a subtree by Node.search_contained()
+_NONE, _BEGIN, _END, _BOTH = range(4)
+
+
+def _gap(interval, begin, end):
+    """
+    Distance from interval to the range [begin, end], or 0 if they
+    touch or overlap. Agrees with Interval.distance_to().
+    """
+    if interval.end <= begin:
+        return begin - interval.end
+    if interval.begin >= end:
+        return interval.begin - end
+    return 0
+
+
+def _bound_gap(lo, hi, begin, end):
+    """
+    A lower bound on _gap() for intervals beginning at or after lo and
+    ending at or before hi; either may be None if unbounded.
+    """
+    if hi is not None and hi <= begin:
+        return begin - hi
+    if lo is not None and lo >= end:
+        return lo - end
+    return 0
+
+
 def l2(num):
     """
     log base 2
@@ -39,10 +70,13 @@ class Node(object):
                  right_node=None):
         self.x_center = x_center
         self.s_center = set(s_center)
+        self._by_begin = None  # s_center sorted by begin; see sorted_center()
+        self._by_end = None    # s_center sorted by end
         self.left_node = left_node
         self.right_node = right_node
         self.depth = 0    # will be set when rotated
         self.balance = 0  # ditto
+        self.shared = False  # may be reachable from another tree; see unshared()
         self.rotate()
 
     @classmethod
@@ -56,12 +90,29 @@ class Node(object):
     @classmethod
     def from_intervals(cls, intervals):
         """
+        Builds a subtree from intervals in any order.
+
+            >>> from interval import Interval
+            >>> node = Node.from_intervals([Interval(3, 4), Interval(1, 2)])
+            >>> sorted(node.all_children())
+            [Interval(1, 2), Interval(3, 4)]
+
+        :rtype : Node
+        """
+        return Node.from_sorted_intervals(
+            sorted(intervals, key=range_key))
+
+    @classmethod
+    def from_sorted_intervals(cls, intervals):
+        """
+        Builds a subtree from a list of intervals sorted by begin.
+        The list is only partitioned, never re-sorted, on the way down.
         :rtype : Node
         """
         if not intervals:
             return None
         node = Node()
-        node = node.init_from_sorted(sorted(intervals))
+        node = node.init_from_sorted(intervals)
         return node
 
     def init_from_sorted(self, intervals):
@@ -70,6 +121,7 @@ class Node(object):
         center_iv = intervals[len(intervals) // 2]
         self.x_center = center_iv.begin
         self.s_center = set()
+        self.center_changed()
         s_left = []
         s_right = []
         for k in intervals:
@@ -79,10 +131,55 @@ class Node(object):
                 s_right.append(k)
             else:
                 self.s_center.add(k)
-        self.left_node = Node.from_intervals(s_left)
-        self.right_node = Node.from_intervals(s_right)
+        # s_left and s_right are subsequences of a sorted list, so they
+        # are still sorted.
+        self.left_node = Node.from_sorted_intervals(s_left)
+        self.right_node = Node.from_sorted_intervals(s_right)
         return self.rotate()
 
+    def unshared(self):
+        """
+        Returns a copy of this node that may be changed in place: the
+        same x_center, a copy of s_center, and the same children, which
+        are marked shared since both nodes now point to them.
+
+        Trees made by IntervalTree.copy() share their nodes. A node
+        marked shared is never changed in place; each method that would
+        change it works on, and returns, its unshared() copy instead,
+        so only the nodes along a changed path get copied.
+        :rtype: Node
+        """
+        node = self.__class__.__new__(self.__class__)
+        node.__dict__.update(self.__dict__)
+        node.s_center = set(self.s_center)
+        node.shared = False
+        for child in (self.left_node, self.right_node):
+            if child:
+                child.shared = True
+        return node
+
+    def center_changed(self):
+        """
+        Drops the sorted views of s_center. Must be called whenever
+        s_center is modified.
+        """
+        self._by_begin = None
+        self._by_end = None
+
+    def sorted_center(self):
+        """
+        Returns s_center as two lists, sorted by begin and by end.
+        They are built on first use and kept until s_center changes.
+        :rtype: (list of Interval, list of Interval)
+        """
+        if self._by_begin is None:
+            # Each view is complete once set, and _by_begin, which
+            # readers test, is set last, so concurrent readers never
+            # see a missing view.
+            self._by_end = sorted(self.s_center, key=attrgetter('end'))
+            self._by_begin = sorted(self.s_center, key=attrgetter('begin'))
+        return self._by_begin, self._by_end
+
     def center_hit(self, interval):
         """Returns whether interval overlaps self.x_center."""
         return interval.contains_point(self.x_center)
@@ -140,6 +237,8 @@ class Node(object):
 
     def srotate(self):
         """Single rotation. Assumes that balance is +-2."""
+        if self.shared:
+            return self.unshared().srotate()
         #     self        save         save
         #   save 3  ->   1   self  -> 1   self.rot()
         #  1   2            2   3
@@ -152,6 +251,8 @@ class Node(object):
         heavy = self.balance > 0
         light = not heavy
         save = self[heavy]
+        if save.shared:
+            save = save.unshared()
         #print("srotate: bal={},{}".format(self.balance, save.balance))
         #self.print_structure()
         self[heavy] = save[light]   # 2
@@ -168,10 +269,13 @@ class Node(object):
             # For now, this is the same as augmenting save.s_center, but that may
             # change.
             save.s_center.update(promotees)
+            save.center_changed()
         save.refresh_balance()
         return save
 
     def drotate(self):
+        if self.shared:
+            return self.unshared().drotate()
         # First rotation
         my_heavy = self.balance > 0
         self[my_heavy] = self[my_heavy].srotate()
@@ -186,8 +290,11 @@ class Node(object):
         """
         Returns self after adding the interval and balancing.
         """
+        if self.shared:
+            return self.unshared().add(interval)
         if self.center_hit(interval):
             self.s_center.add(interval)
+            self.center_changed()
             return self
         else:
             direction = self.hit_branch(interval)
@@ -230,6 +337,9 @@ class Node(object):
         See Eternally Confuzzled's jsw_remove_r function (lines 1-32)
         in his AVL tree article for reference.
         """
+        if self.shared:
+            return self.unshared().remove_interval_helper(
+                interval, done, should_raise_error)
         #trace = interval.begin == 347 and interval.end == 353
         #if trace: print('\nRemoving from {} interval {}'.format(
         #   self.x_center, interval))
@@ -246,6 +356,7 @@ class Node(object):
             except:
                 self.print_structure()
                 raise KeyError(interval)
+            self.center_changed()
             if self.s_center:     # keep this node
                 done.append(1)    # no rebalancing necessary
                 #if trace: print('Removed, no rebalancing.')
@@ -290,13 +401,153 @@ class Node(object):
         """
         Returns all intervals that contain point.
         """
-        for k in self.s_center:
-            if k.begin <= point < k.end:
-                result.add(k)
-        if point < self.x_center and self[0]:
-            return self[0].search_point(point, result)
-        elif point > self.x_center and self[1]:
-            return self[1].search_point(point, result)
+        result.update(self.stab_point(point, []))
+        return result
+
+    def stab_point(self, point, out):
+        """
+        Appends all intervals that contain point to the list out, and
+        returns out.
+
+        Every interval in s_center contains x_center, so left of it
+        only begin needs testing, and right of it only end. Walking
+        the matching sorted view stops at the first miss, and the
+        descent is a loop rather than a recursion.
+        """
+        append = out.append
+        node = self
+        while node is not None:
+            if node._by_begin is None:
+                node.sorted_center()
+            if point < node.x_center:
+                for iv in node._by_begin:
+                    if iv.begin > point:
+                        break
+                    append(iv)
+                node = node.left_node
+            elif point > node.x_center:
+                for iv in reversed(node._by_end):
+                    if iv.end <= point:
+                        break
+                    append(iv)
+                node = node.right_node
+            else:
+                out.extend(node._by_begin)
+                break
+        return out
+
+    def search_contained(self, begin, end):
+        """
+        Yields all intervals iv with begin <= iv.begin and
+        iv.end <= end, lazily.
+
+        Each node's x_center decides which bounds still need testing
+        below it: a left subtree holds only intervals ending at or
+        before x_center, and a right subtree only intervals beginning
+        after it. So once the search splits at a node inside the
+        range, the left branch only tests begins, the right branch
+        only tests ends, and whole subtrees inside the range are
+        yielded without any tests.
+        """
+        stack = [(self, _BOTH)]
+        while stack:
+            node, need = stack.pop()
+            if node is None:
+                continue
+            if node._by_begin is None:
+                node.sorted_center()
+            x_center = node.x_center
+            if need == _NONE:
+                for iv in node.s_center:
+                    yield iv
+                stack.append((node.left_node, _NONE))
+                stack.append((node.right_node, _NONE))
+            elif need == _BOTH:
+                if x_center < begin:
+                    stack.append((node.right_node, _BOTH))
+                elif x_center >= end:
+                    stack.append((node.left_node, _BOTH))
+                else:
+                    for iv in reversed(node._by_begin):
+                        if iv.begin < begin:
+                            break
+                        if iv.end <= end:
+                            yield iv
+                    stack.append((node.left_node, _BEGIN))
+                    stack.append((node.right_node, _END))
+            elif need == _BEGIN:
+                if x_center < begin:
+                    stack.append((node.right_node, _BEGIN))
+                else:
+                    for iv in reversed(node._by_begin):
+                        if iv.begin < begin:
+                            break
+                        yield iv
+                    stack.append((node.left_node, _BEGIN))
+                    stack.append((node.right_node, _NONE))
+            else:  # need == _END
+                if x_center >= end:
+                    stack.append((node.left_node, _END))
+                else:
+                    for iv in node._by_end:
+                        if iv.end > end:
+                            break
+                        yield iv
+                    stack.append((node.left_node, _NONE))
+                    stack.append((node.right_node, _END))
+
+    def child_bounds(self, direction, lo, hi):
+        """
+        Given that every interval in this subtree begins at or after lo
+        and ends at or before hi (None if unbounded), returns the same
+        bounds for the subtree self[direction]. Intervals to the left
+        end at or before x_center, and those to the right begin after
+        it.
+        """
+        if direction:
+            return self.x_center, hi
+        return lo, self.x_center
+
+    def nearest(self, begin, end, k):
+        """
+        Returns (distance, interval) pairs for up to k intervals
+        nearest to the range [begin, end], nearest first. A point is
+        given as begin == end.
+
+        Best-first search: subtrees are queued by a lower bound on the
+        distance of their intervals, from the bounds their ancestors
+        imply (see child_bounds()), and each node's own intervals are
+        queued lazily, in order of distance, as a run of its sorted
+        center.
+        """
+        result = []
+        tie = count()
+        # (distance, tie, node, lo, hi) for a subtree, or
+        # (distance, tie, None, interval, rest of its run)
+        queue = [(0, next(tie), self, None, None)]
+        while queue and len(result) < k:
+            distance, _, node, a, b = heappop(queue)
+            if node is None:
+                result.append((distance, a))
+                iv = next(b, None)
+                if iv is not None:
+                    heappush(queue, (_gap(iv, begin, end), next(tie), None, iv, b))
+                continue
+            if node._by_begin is None:
+                node.sorted_center()
+            if begin > node.x_center:
+                # every interval here begins at or before x_center
+                run = reversed(node._by_end)
+            else:
+                run = iter(node._by_begin)
+            iv = next(run)
+            heappush(queue, (_gap(iv, begin, end), next(tie), None, iv, run))
+            for direction in (0, 1):
+                child = node[direction]
+                if child:
+                    lo, hi = node.child_bounds(direction, a, b)
+                    heappush(queue, (_bound_gap(lo, hi, begin, end),
+                                     next(tie), child, lo, hi))
         return result
 
     def prune(self):
@@ -304,6 +555,8 @@ class Node(object):
         On a subtree where the root node's s_center is empty,
         return a new subtree with no empty s_centers.
         """
+        if self.shared:
+            return self.unshared().prune()
         if not self[0] or not self[1]:    # if I have an empty branch
             direction = not self[0]       # graft the other branch here
             #if trace:
@@ -355,6 +608,8 @@ class Node(object):
         See Eternally Confuzzled's jsw_remove_r function (lines 34-54)
         in his AVL tree article for reference.
         """
+        if self.shared:
+            return self.unshared().pop_greatest_child()
         #print('Popping from {}'.format(self.x_center))
         if not self.right_node:         # This node is the greatest child.
             # To reduce the chances of an overlap with a parent, return
@@ -372,11 +627,11 @@ class Node(object):
                     if iv.contains_point(new_x_center): yield iv
 
             # Create a new node with the largest x_center possible.
-            child = Node.from_intervals(get_new_s_center())
-            #     [iv for iv in self.s_center if iv.contains_point(child_x_center)]
-            # )
-            child.x_center = new_x_center
+            # All of these contain new_x_center, so they belong in one
+            # childless node; from_intervals() could split them.
+            child = Node(new_x_center, get_new_s_center())
             self.s_center -= child.s_center
+            self.center_changed()
 
             #print('Pop hit! Returning child   = {}'.format(
             #    child.print_structure(tostring=True)
@@ -396,26 +651,29 @@ class Node(object):
         else:
             #print('Pop descent to {}'.format(self[1].x_center))
             (greatest_child, self[1]) = self[1].pop_greatest_child()
-            self.refresh_balance()
-            new_self = self.rotate()
 
-            # Move any overlaps into greatest_child
-            for iv in set(new_self.s_center):
+            # Move any overlaps into greatest_child. This must happen
+            # before rotating: afterwards, self may no longer be on top,
+            # and its overlaps would end up below greatest_child.
+            for iv in set(self.s_center):
                 if iv.contains_point(greatest_child.x_center):
-                    new_self.s_center.remove(iv)
+                    self.s_center.remove(iv)
+                    self.center_changed()
                     greatest_child.add(iv)
 
             #print('Pop Returning child   = {}'.format(
             #    greatest_child.print_structure(tostring=True)
             #    ))
-            if new_self.s_center:
+            if self.s_center:
+                self.refresh_balance()
+                new_self = self.rotate()
                 #print('and returning newnode = {}'.format(
                 #    new_self.print_structure(tostring=True)
                 #    ))
                 #new_self.verify()
                 return greatest_child, new_self
             else:
-                new_self = new_self.prune()
+                new_self = self.prune()
                 #print('and returning prune = {}'.format(
                 #    new_self.print_structure(tostring=True)
                 #    ))
@@ -426,11 +684,50 @@ class Node(object):
         """
         Returns whether this node or a child overlaps p.
         """
-        for iv in self.s_center:
-            if iv.contains_point(p):
-                return True
-        branch = self[p > self.x_center]
-        return branch and branch.contains_point(p)
+        node = self
+        while node is not None:
+            if node._by_begin is None:
+                node.sorted_center()
+            if p < node.x_center:
+                if node._by_begin and node._by_begin[0].begin <= p:
+                    return True
+                node = node.left_node
+            elif p > node.x_center:
+                if node._by_end and node._by_end[-1].end > p:
+                    return True
+                node = node.right_node
+            else:
+                return bool(node.s_center)
+        return False
+
+    def has_interval(self, interval):
+        """
+        Returns whether this node or a child holds interval. Only the
+        path add() would take for interval is searched.
+
+        Completes in O(log n) time.
+        """
+        node = self
+        while node is not None:
+            if node.center_hit(interval):
+                return interval in node.s_center
+            node = node[node.hit_branch(interval)]
+        return False
+
+    def iter_children(self):
+        """
+        Iterates over the intervals of this node and its children,
+        without collecting them as all_children() does.
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            for iv in node.s_center:
+                yield iv
+            if node.right_node:
+                stack.append(node.right_node)
+            if node.left_node:
+                stack.append(node.left_node)
 
     def all_children(self):
         return self.all_children_helper(set())
@@ -0,0 +1,446 @@
+"""
+intervaltree: A mutable, self-balancing interval tree for Python 2 and 3.
+Queries may be by point, by range overlap, or by range envelopment.
+
+Core logic: sorted boundary index.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from bisect import bisect_left, bisect_right
+from itertools import chain, islice
+
+
+class SortedDict(object):
+    """
+    A mapping whose keys are kept in sorted order.
+
+    Keys are stored in a list of sorted blocks of bounded size, with a
+    parallel list of value blocks, so insertion and deletion only shift
+    one block, while lookup, bisection and positional access
+    (``iloc``) take O(log n) time. This is the subset of
+    ``sortedcontainers.SortedDict`` used by IntervalTree's boundary
+    table, without the external dependency.
+
+    The position of each block's first key comes from a Fenwick tree
+    over the block lengths, which an insertion or deletion updates in
+    O(log n) time. Splitting, merging or dropping a block, which takes
+    on the order of _load updates to that block, discards it, and the
+    next positional lookup rebuilds it in O(n / _load) time.
+
+    copy() shares the blocks between the two dicts. Whichever changes
+    a shared block first copies that block alone; see _own().
+
+        >>> d = SortedDict([(3, 'c'), (1, 'a'), (2, 'b')])
+        >>> list(d)
+        [1, 2, 3]
+        >>> d.bisect_left(2), d.iloc[0], d.iloc[-1]
+        (1, 1, 3)
+        >>> list(d.irange(1, 3, inclusive=(False, True)))
+        [2, 3]
+        >>> e = d.copy()
+        >>> e[4] = 'd'; del d[1]
+        >>> d.items(), e.keys()
+        ([(2, 'b'), (3, 'c')], [1, 2, 3, 4])
+    """
+    _load = 512  # target block size; blocks split at twice this
+
+    def __init__(self, items=None):
+        self._lists = []     # sorted blocks of keys
+        self._values = []    # values of the keys in _lists, block by block
+        self._maxes = []     # greatest key of each block
+        self._owned = []     # whether each block is unshared; see copy()
+        self._len = 0
+        self._index = None   # Fenwick tree over block lengths; lazy
+        self.iloc = _KeyIndexer(self)
+        if items is not None:
+            self.update(items)
+
+    @classmethod
+    def from_sorted_items(cls, items):
+        """
+        Builds a SortedDict from (key, value) pairs already in strictly
+        ascending key order, without sorting or bisecting.
+
+        Completes in O(n) time.
+        :rtype: SortedDict
+        """
+        items = list(items)
+        result = cls()
+        result._set_items([key for key, _ in items],
+                          [value for _, value in items])
+        return result
+
+    def _set_items(self, keys, values):
+        """
+        Replaces the blocks with the sorted list keys and the list of
+        their values.
+        """
+        load = self._load
+        self._lists = [keys[i:i + load] for i in range(0, len(keys), load)]
+        self._values = [values[i:i + load] for i in range(0, len(keys), load)]
+        self._maxes = [block[-1] for block in self._lists]
+        self._owned = [True] * len(self._lists)
+        self._len = len(keys)
+        self._index = None
+
+    def update(self, items):
+        """
+        Sets each (key, value) pair in items. Large updates re-sort the
+        keys once instead of inserting them one at a time.
+        """
+        if hasattr(items, 'items'):
+            items = items.items()
+        items = list(items)
+        if len(items) * 8 < self._len:
+            for key, value in items:
+                self[key] = value
+            return
+        merged = dict(self.items())
+        merged.update(items)
+        keys = sorted(merged)
+        self._set_items(keys, [merged[key] for key in keys])
+
+    def _find(self, key):
+        """
+        Returns (block, position within the block) where key is, or
+        would be inserted.
+        """
+        maxes = self._maxes
+        pos = bisect_left(maxes, key)
+        if pos == len(maxes):
+            pos -= 1
+            return pos, len(self._lists[pos])
+        return pos, bisect_left(self._lists[pos], key)
+
+    def _own(self, pos):
+        """
+        Copies block pos, if it is still shared with a copy(), so that
+        it can be changed in place.
+        """
+        if not self._owned[pos]:
+            self._lists[pos] = list(self._lists[pos])
+            self._values[pos] = list(self._values[pos])
+            self._owned[pos] = True
+
+    def _build_index(self):
+        """
+        Builds the Fenwick tree over the block lengths: _index[i] holds
+        the total length of the blocks (i - (i & -i), i], counted from 1.
+        """
+        index = [0] * (len(self._lists) + 1)
+        for i, block in enumerate(self._lists, 1):
+            index[i] += len(block)
+            parent = i + (i & -i)
+            if parent < len(index):
+                index[parent] += index[i]
+        self._index = index
+
+    def _resize_block(self, pos, delta):
+        """
+        Records that block pos grew by delta keys.
+        """
+        index = self._index
+        if index is None:
+            return
+        i = pos + 1
+        while i < len(index):
+            index[i] += delta
+            i += i & -i
+
+    def _offset(self, pos):
+        """
+        Returns the position of the first key of block pos.
+        """
+        if self._index is None:
+            self._build_index()
+        index = self._index
+        total = 0
+        while pos > 0:
+            total += index[pos]
+            pos -= pos & -pos
+        return total
+
+    def _locate(self, index):
+        """
+        Returns (block, position within the block) of the key at
+        position index, which must be in range.
+        """
+        if self._index is None:
+            self._build_index()
+        tree = self._index
+        pos = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            nxt = pos + step
+            if nxt < len(tree) and tree[nxt] <= index:
+                pos = nxt
+                index -= tree[nxt]
+            step >>= 1
+        return pos, index
+
+    def _split(self, pos):
+        """
+        Splits block pos, which must be owned, in two halves if it grew
+        past twice _load.
+        """
+        block = self._lists[pos]
+        if len(block) > 2 * self._load:
+            mid = len(block) // 2
+            values = self._values[pos]
+            self._lists.insert(pos + 1, block[mid:])
+            self._values.insert(pos + 1, values[mid:])
+            self._owned.insert(pos + 1, True)
+            del block[mid:]
+            del values[mid:]
+            self._maxes[pos] = block[-1]
+            self._maxes.insert(pos + 1, self._lists[pos + 1][-1])
+            self._index = None
+
+    def __setitem__(self, key, value):
+        if not self._maxes:
+            self._set_items([key], [value])
+            return
+        pos, i = self._find(key)
+        block = self._lists[pos]
+        if i < len(block) and block[i] == key:
+            self._own(pos)
+            self._values[pos][i] = value
+            return
+        self._own(pos)
+        self._lists[pos].insert(i, key)
+        self._values[pos].insert(i, value)
+        self._maxes[pos] = self._lists[pos][-1]
+        self._len += 1
+        self._resize_block(pos, 1)
+        self._split(pos)
+
+    def __delitem__(self, key):
+        pos, i = self._find(key)
+        if not (i < len(self._lists[pos]) and self._lists[pos][i] == key):
+            raise KeyError(key)
+        self._own(pos)
+        block = self._lists[pos]
+        del block[i]
+        del self._values[pos][i]
+        self._len -= 1
+        maxes = self._maxes
+        if not block:
+            del self._lists[pos]
+            del self._values[pos]
+            del self._owned[pos]
+            del maxes[pos]
+            self._index = None
+        else:
+            maxes[pos] = block[-1]
+            self._resize_block(pos, -1)
+            if len(block) < self._load // 2 and pos + 1 < len(maxes):
+                # merge with the next block so blocks stay dense, then
+                # split again if that made the block too long
+                block.extend(self._lists.pop(pos + 1))
+                self._values[pos].extend(self._values.pop(pos + 1))
+                del self._owned[pos + 1]
+                del maxes[pos]
+                self._index = None
+                self._split(pos)
+
+    def __getitem__(self, key):
+        if self._maxes:
+            pos, i = self._find(key)
+            block = self._lists[pos]
+            if i < len(block) and block[i] == key:
+                return self._values[pos][i]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        if not self._maxes:
+            return False
+        pos, i = self._find(key)
+        block = self._lists[pos]
+        return i < len(block) and block[i] == key
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return chain.from_iterable(self._lists)
+
+    def __reversed__(self):
+        for block in reversed(self._lists):
+            for key in reversed(block):
+                yield key
+
+    def keys(self):
+        """
+        Returns a list of the keys in ascending order.
+        :rtype: list
+        """
+        return list(self)
+
+    def values(self):
+        """
+        Returns a list of the values in ascending key order.
+        :rtype: list
+        """
+        return list(chain.from_iterable(self._values))
+
+    def items(self):
+        """
+        Returns a list of (key, value) pairs in ascending key order.
+        :rtype: list of tuple
+        """
+        return list(zip(self, chain.from_iterable(self._values)))
+
+    def clear(self):
+        self._set_items([], [])
+
+    def copy(self):
+        """
+        Shallow copy. The blocks are shared with the copy until either
+        dict changes them; see _own().
+
+        Completes in O(n / _load) time.
+        :rtype: SortedDict
+        """
+        result = type(self)()
+        result._lists = list(self._lists)
+        result._values = list(self._values)
+        result._maxes = list(self._maxes)
+        result._len = self._len
+        if self._index is not None:
+            result._index = list(self._index)
+        self._owned = [False] * len(self._lists)
+        result._owned = list(self._owned)
+        return result
+
+    def bisect_left(self, key):
+        """
+        Returns the position where key would be inserted to the left
+        of any equal key.
+
+        Completes in O(log n) time.
+        :rtype: int
+        """
+        maxes = self._maxes
+        pos = bisect_left(maxes, key)
+        if pos == len(maxes):
+            return self._len
+        return self._offset(pos) + bisect_left(self._lists[pos], key)
+
+    def bisect_right(self, key):
+        """
+        Returns the position where key would be inserted to the right
+        of any equal key.
+
+        Completes in O(log n) time.
+        :rtype: int
+        """
+        maxes = self._maxes
+        pos = bisect_right(maxes, key)
+        if pos == len(maxes):
+            return self._len
+        return self._offset(pos) + bisect_right(self._lists[pos], key)
+
+    def key_at(self, index):
+        """
+        Returns the key at position index in ascending order. Negative
+        indices count from the end.
+
+        Completes in O(log n) time.
+        :raises IndexError: if index is out of range
+        """
+        size = self._len
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("SortedDict index out of range")
+        pos, offset = self._locate(index)
+        return self._lists[pos][offset]
+
+    def islice(self, start=None, stop=None):
+        """
+        Iterates over the keys at positions [start, stop).
+
+        Completes in O(log n + m) time, where m is the number of keys
+        yielded.
+        """
+        size = self._len
+        start = 0 if start is None else max(0, min(start, size))
+        stop = size if stop is None else max(0, min(stop, size))
+        if start >= stop:
+            return iter(())
+        pos, skip = self._locate(start)
+        return islice(
+            chain.from_iterable(self._lists[pos:]),
+            skip, skip + stop - start
+        )
+
+    def irange(self, minimum=None, maximum=None, inclusive=(True, True)):
+        """
+        Iterates over the keys between minimum and maximum. Either
+        bound may be None for an open end; inclusive tells whether
+        each bound is itself included.
+
+        Completes in O(log n + m) time, where m is the number of keys
+        yielded.
+        """
+        if minimum is None:
+            start = 0
+        elif inclusive[0]:
+            start = self.bisect_left(minimum)
+        else:
+            start = self.bisect_right(minimum)
+        if maximum is None:
+            stop = self._len
+        elif inclusive[1]:
+            stop = self.bisect_right(maximum)
+        else:
+            stop = self.bisect_left(maximum)
+        return self.islice(start, stop)
+
+    def __eq__(self, other):
+        if isinstance(other, SortedDict):
+            return self.items() == other.items()
+        return dict(self.items()) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "SortedDict({0})".format(self.items())
+
+    __str__ = __repr__
+
+
+class _KeyIndexer(object):
+    """
+    Positional access to the keys of a SortedDict, as in
+    ``sorted_dict.iloc[0]``.
+    """
+    __slots__ = ('_sorted_dict',)
+
+    def __init__(self, sorted_dict):
+        self._sorted_dict = sorted_dict
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self._sorted_dict)[index]
+        return self._sorted_dict.key_at(index)
+
+    def __len__(self):
+        return len(self._sorted_dict)
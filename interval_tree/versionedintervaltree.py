@@ -0,0 +1,196 @@
+"""
+intervaltree: A mutable, self-balancing interval tree for Python 2 and 3.
+Queries may be by point, by range overlap, or by range envelopment.
+
+Interval tree for concurrent readers and a single writer.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from contextlib import contextmanager
+from intervaltree import IntervalTree
+from threading import Lock
+
+
+class VersionedIntervalTree(object):
+    """
+    An interval tree that any number of threads may query while
+    another thread edits it. Queries never block on edits, and never
+    see an edit half done.
+
+    The tree is a sequence of published versions, each an IntervalTree
+    that is never changed once published. An edit works on a copy() of
+    the latest version. When the edit is done, the copy is published by
+    replacing a single reference. Edits are serialized by a lock, which
+    queries never take.
+
+    The copy shares the tree nodes with the latest version and only
+    copies the nodes on the edited paths (see Node.unshared()). It
+    shares the boundary table block by block in the same way (see
+    SortedDict.copy()). Publishing a version therefore costs O(n / 512)
+    time for the copy, plus O(log n) time per change.
+
+    A published version is never edited, but queries on it still fill
+    caches on first use: IntervalTree.sorted_intervals(),
+    endpoint_arrays(), the max_depth() segment tree, the sorted views
+    of each node (Node.sorted_center()) and, if enabled, the query
+    cache. Each fill builds its value completely and then stores it
+    with a single assignment. Threads that race on a fill may both
+    build the value, but they never see a partial one.
+
+        >>> from interval import Interval
+        >>> tree = VersionedIntervalTree([Interval(0, 10)])
+        >>> before = tree.snapshot()
+        >>> with tree.edit() as edits:
+        ...     edits.add(Interval(5, 15))
+        ...     edits.remove(Interval(0, 10))
+        >>> tree.search(7), before.search(7)
+        ({Interval(5, 15)}, {Interval(0, 10)})
+        >>> tree.version
+        1
+
+    Each version starts with cold caches, so group many small edits in
+    one edit() block.
+    """
+    def __init__(self, intervals=None, engine='centered'):
+        """
+        Set up a tree, as IntervalTree(intervals, engine).
+
+        Completes in O(n*log n) time.
+        """
+        self._head = (0, IntervalTree(intervals, engine=engine))
+        self._write_lock = Lock()
+
+    @property
+    def version(self):
+        """
+        The number of edits published so far.
+        :rtype: int
+        """
+        return self._head[0]
+
+    def snapshot(self):
+        """
+        Returns the latest published version, an IntervalTree that no
+        edit will change. Query it, but do not modify it. For several
+        queries that must agree with each other, take one snapshot and
+        query that, rather than this tree.
+
+        Completes in O(1) time.
+        :rtype: IntervalTree
+        """
+        return self._head[1]
+
+    @contextmanager
+    def edit(self):
+        """
+        Context manager yielding a private copy of the latest version,
+        to be modified like any IntervalTree::
+
+            with tree.edit() as edits:
+                edits.add(Interval(0, 10))
+                edits.chop(5, 15)
+
+        When the block exits, the copy is published as the next
+        version. If the block raises, nothing is published. Only one
+        edit() block runs at a time; others wait for it.
+
+        Completes in O(n / 512) time, on top of the cost of the
+        changes themselves.
+        """
+        with self._write_lock:
+            version, latest = self._head
+            edits = latest.copy()
+            yield edits
+            self._head = (version + 1, edits)
+
+    def add(self, interval):
+        """
+        Adds an interval and publishes the result.
+
+        Completes in O(log n) time, plus O(n / 512) to publish a new
+        version.
+        """
+        with self.edit() as edits:
+            edits.add(interval)
+
+    def remove(self, interval):
+        """
+        Removes an interval and publishes the result. If the interval
+        is not present, raises ValueError.
+
+        Completes in O(log n) time, plus O(n / 512) to publish a new
+        version.
+        """
+        with self.edit() as edits:
+            edits.remove(interval)
+
+    def discard(self, interval):
+        """
+        Removes an interval, if present, and publishes the result.
+
+        Completes in O(log n) time, plus O(n / 512) to publish a new
+        version.
+        """
+        with self.edit() as edits:
+            edits.discard(interval)
+
+    def apply(self, adds=(), removes=()):
+        """
+        Applies IntervalTree.apply(adds, removes) and publishes the
+        result.
+        """
+        with self.edit() as edits:
+            edits.apply(adds=adds, removes=removes)
+
+    def search(self, begin, end=None, strict=False):
+        """
+        IntervalTree.search() on the latest version.
+        :rtype: set of Interval
+        """
+        return self.snapshot().search(begin, end, strict)
+
+    def stab(self, point, out=None):
+        """
+        IntervalTree.stab() on the latest version.
+        :rtype: list of Interval
+        """
+        return self.snapshot().stab(point, out)
+
+    def overlaps(self, begin, end=None):
+        """
+        IntervalTree.overlaps() on the latest version.
+        :rtype: bool
+        """
+        return self.snapshot().overlaps(begin, end)
+
+    def __getitem__(self, index):
+        return self.snapshot()[index]
+
+    def __contains__(self, item):
+        return item in self.snapshot()
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def __len__(self):
+        return len(self.snapshot())
+
+    def __repr__(self):
+        """
+        :rtype: str
+        """
+        version, latest = self._head
+        return "VersionedIntervalTree({0!r}, version={1})".format(
+            sorted(latest), version)
+
+    __str__ = __repr__